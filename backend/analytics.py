@@ -0,0 +1,260 @@
+"""Occupancy analytics from materialised daily rollups.
+
+db.daily_rollups holds one document per day with its counters, in total and
+per booked slot::
+
+    {"_id": "2026-03-14", "covers": 84, "bookings": 31, "cancellations": 4,
+     "no_shows": 2, "no_show_covers": 5,
+     "slots": {"19:00": {"covers": 22, "bookings": 8, ...}, ...}}
+
+`Rollups` keeps them up to date with a single $inc per write: a booking adds
+its covers, a cancellation moves them out, a no-show is counted on top of
+the booking. Range queries read only the rollups of the range and aggregate
+them with pandas (`summarise`), imported on first use so that workers which
+never serve analytics do not load it; `rebuild` recomputes every rollup from the
+reservations and the archive in one streaming pass::
+
+    python analytics.py rebuild
+"""
+import asyncio
+import logging
+import os
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import TYPE_CHECKING, AsyncIterator, Dict, Iterable, List, Optional, Set, Tuple
+
+from dotenv import load_dotenv
+from motor.motor_asyncio import AsyncIOMotorCollection, AsyncIOMotorDatabase
+from pymongo import UpdateOne
+from pymongo.errors import PyMongoError
+
+import seating
+
+if TYPE_CHECKING:
+    import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+CONFIRMED = "confirmed"
+CANCELLED = "cancelled"
+NO_SHOW = "no_show"
+
+FIELDS = ("covers", "bookings", "cancellations", "no_shows", "no_show_covers")
+REBUILD_BATCH_SIZE = 500
+
+
+def counts(status: Optional[str], guests: int) -> Dict[str, int]:
+    """What one reservation contributes to its day and slot."""
+    if status == CANCELLED:
+        return {"cancellations": 1}
+    contribution = {"covers": guests, "bookings": 1}
+    if status == NO_SHOW:
+        contribution.update(no_shows=1, no_show_covers=guests)
+    return contribution
+
+
+def rollup(reservations: Iterable[dict]) -> dict:
+    """Counters of one day, in total and per slot."""
+    slots: Dict[str, Dict[str, int]] = {}
+    for res in reservations:
+        slot = slots.setdefault(res["time"], dict.fromkeys(FIELDS, 0))
+        for field, value in counts(res.get("status"), res["guests"]).items():
+            slot[field] += value
+    totals = {field: sum(slot[field] for slot in slots.values()) for field in FIELDS}
+    return {**totals, "slots": dict(sorted(slots.items()))}
+
+
+def _add(increments: dict, time: str, contribution: Dict[str, int], sign: int = 1) -> dict:
+    for field, value in contribution.items():
+        for path in (field, f"slots.{time}.{field}"):
+            increments[path] = increments.get(path, 0) + sign * value
+    return increments
+
+
+async def _days(cursor, skip: Set[str]) -> AsyncIterator[Tuple[str, List[dict]]]:
+    """(date, reservations) of a cursor sorted by date, leaving out the days in `skip`."""
+    day, reservations = None, []
+    async for res in cursor:
+        if res["date"] in skip:
+            continue
+        if res["date"] != day:
+            if reservations:
+                yield day, reservations
+            day, reservations = res["date"], []
+        reservations.append(res)
+    if reservations:
+        yield day, reservations
+
+
+class Rollups:
+    def __init__(self, collection: AsyncIOMotorCollection):
+        self.collection = collection
+
+    async def _apply(self, updates: Dict[str, dict]):
+        if not updates:
+            return
+        try:
+            await self.collection.bulk_write(
+                [UpdateOne({"_id": day}, {"$inc": inc}, upsert=True) for day, inc in updates.items()],
+                ordered=False
+            )
+        except PyMongoError:
+            # The reservations are stored already; `rebuild` repairs a missed increment
+            logger.exception("Could not update the daily rollups")
+
+    async def booked(self, reservations: Iterable[Tuple[str, str, int]]):
+        """Count new (date, time, guests) bookings, with one update per day."""
+        updates: Dict[str, dict] = {}
+        for day, time, guests in reservations:
+            _add(updates.setdefault(day, {}), time, counts(CONFIRMED, guests))
+        await self._apply(updates)
+
+    async def cancelled(self, day: str, time: str, guests: int, status: str = CONFIRMED):
+        increments = _add({}, time, counts(status, guests), -1)
+        await self._apply({day: _add(increments, time, counts(CANCELLED, guests))})
+
+    async def no_show(self, day: str, time: str, guests: int):
+        increments = _add({}, time, counts(CONFIRMED, guests), -1)
+        await self._apply({day: _add(increments, time, counts(NO_SHOW, guests))})
+
+    async def rebuild(self, db: AsyncIOMotorDatabase) -> int:
+        """Recompute every rollup from the reservations and the archive; returns the days written.
+
+        Each collection is read once, sorted by date. A day is taken from the
+        archive once its archival completed, otherwise from the hot
+        collection when it has reservations there. A day found only in the
+        archive has been archived completely (the hot copies are deleted
+        last), so its rollup is marked ``archived_at`` as `Archiver` does.
+        """
+        archived_at = {
+            doc["_id"] async for doc in self.collection.find({"archived_at": {"$exists": True}}, {"_id": 1})
+        }
+        projection = {"_id": 0, "date": 1, "time": 1, "guests": 1, "status": 1}
+        hot_days: Set[str] = set()
+        written, batch = 0, []
+
+        async def write(day: str, reservations: List[dict], archived: bool = False):
+            nonlocal written, batch
+            summary = rollup(reservations)
+            if archived and day not in archived_at:
+                summary["archived_at"] = datetime.now(timezone.utc).isoformat()
+            batch.append(UpdateOne({"_id": day}, {"$set": summary}, upsert=True))
+            written += 1
+            if len(batch) == REBUILD_BATCH_SIZE:
+                await self.collection.bulk_write(batch, ordered=False)
+                batch = []
+
+        hot = db.reservations.find({}, projection).sort("date", 1)
+        async for day, reservations in _days(hot, archived_at):
+            hot_days.add(day)
+            await write(day, reservations)
+        cold = db.reservations_archive.find({}, projection).sort("date", 1)
+        async for day, reservations in _days(cold, hot_days):
+            await write(day, reservations, archived=True)
+        if batch:
+            await self.collection.bulk_write(batch, ordered=False)
+        return written
+
+    async def frame(self, start: str, end: str) -> "pd.DataFrame":
+        """One row per (date, slot) of the rollups between `start` and `end` inclusive."""
+        import pandas as pd
+
+        rows = []
+        async for doc in self.collection.find({"_id": {"$gte": start, "$lte": end}}, {"slots": 1}):
+            for time, slot in doc.get("slots", {}).items():
+                rows.append((doc["_id"], time, *(slot.get(field, 0) for field in FIELDS)))
+        return pd.DataFrame.from_records(rows, columns=["date", "time", *FIELDS])
+
+
+def _rates(frame: "pd.DataFrame") -> "pd.DataFrame":
+    import numpy as np
+
+    bookings = frame["bookings"].replace(0, np.nan)
+    frame["avg_party_size"] = (frame["covers"] / bookings).round(2)
+    frame["no_show_rate"] = (frame["no_shows"] / bookings).round(4)
+    frame["cancellation_rate"] = (
+        frame["cancellations"] / (frame["bookings"] + frame["cancellations"]).replace(0, np.nan)
+    ).round(4)
+    return frame
+
+
+def _records(frame: "pd.DataFrame") -> List[dict]:
+    # Plain Python values with None for NaN, ready for JSON
+    return frame.astype(object).where(frame.notna(), None).to_dict("records")
+
+
+def seated_per_mark(frame: "pd.DataFrame") -> "pd.DataFrame":
+    """Guests seated at every half-hour mark of every day, a party counting for its whole sitting."""
+    import numpy as np
+    import pandas as pd
+
+    booked = frame[frame["covers"] > 0]
+    starts = booked["time"].map(seating.mark_index).to_numpy()
+    marks = (starts[:, None] + np.arange(seating.SITTING_MARKS)).ravel()
+    seated = pd.DataFrame({
+        "date": np.repeat(booked["date"].to_numpy(), seating.SITTING_MARKS),
+        "mark": marks,
+        "covers": np.repeat(booked["covers"].to_numpy(), seating.SITTING_MARKS),
+    })
+    seated = seated[seated["mark"] < seating.MARKS_PER_DAY]
+    return seated.groupby(["date", "mark"])["covers"].sum().unstack(fill_value=0)
+
+
+def summarise(frame: "pd.DataFrame") -> dict:
+    """Totals, per-day series, per-slot figures and the weekly no-show trend of a rollup frame.
+
+    Fill rates are the guests seated at a mark over the covers capacity,
+    averaged over the days of the range that have bookings.
+    """
+    import pandas as pd
+
+    if frame.empty:
+        return {"totals": None, "days": [], "slots": [], "no_show_trend": []}
+    fields = list(FIELDS)
+
+    days = _rates(frame.groupby("date")[fields].sum())
+    totals = _rates(days[fields].sum().to_frame().T)
+
+    seated = seated_per_mark(frame).reindex(days.index, fill_value=0)
+    fill = (seated.mean() / seating.COVERS_CAPACITY).round(4)
+    fill.index = [seating.MARK_LABELS[mark] for mark in fill.index]
+    days["peak_fill_rate"] = (seated.max(axis=1) / seating.COVERS_CAPACITY).round(4)
+
+    slots = _rates(frame.groupby("time")[fields].sum())
+    slots = slots.reindex(slots.index.union(fill.index))
+    slots[fields] = slots[fields].fillna(0).astype(int)
+    slots["fill_rate"] = fill.reindex(slots.index).fillna(0.0)
+
+    weeks = days[fields].groupby(pd.to_datetime(days.index).to_period("W")).sum()
+    weeks = _rates(weeks)
+    trend = pd.DataFrame({
+        "week": [period.start_time.date().isoformat() for period in weeks.index],
+        "bookings": weeks["bookings"].to_numpy(),
+        "no_shows": weeks["no_shows"].to_numpy(),
+        "no_show_rate": weeks["no_show_rate"].to_numpy(),
+    })
+
+    return {
+        "totals": _records(totals)[0],
+        "days": _records(days.rename_axis("date").reset_index()),
+        "slots": _records(slots.rename_axis("time").reset_index()),
+        "no_show_trend": _records(trend),
+    }
+
+
+async def _main():
+    from motor.motor_asyncio import AsyncIOMotorClient
+
+    load_dotenv(Path(__file__).parent / '.env')
+    client = AsyncIOMotorClient(os.environ['MONGO_URL'])
+    db = client[os.environ['DB_NAME']]
+    days = await Rollups(db.daily_rollups).rebuild(db)
+    print(f"Rebuilt the rollups of {days} days")
+
+
+if __name__ == "__main__":
+    import sys
+
+    if sys.argv[1:] != ["rebuild"]:
+        sys.exit("usage: python analytics.py rebuild")
+    asyncio.run(_main())
@@ -0,0 +1,116 @@
+"""Archival of past reservations to a cold collection.
+
+`Archiver` periodically moves reservations dated more than `horizon_days`
+ago from db.reservations to db.reservations_archive, one day at a time, so
+that the hot collection and its indexes only hold recent and upcoming
+bookings. For every archived day it first writes its compact rollup to
+db.daily_rollups (covers, bookings, cancellations and no-shows per slot, see
+analytics.py), recomputed from the archived reservations and marked with
+``archived_at``.
+
+Each day is copied, rolled up from the archive copy, then deleted from the
+hot collection, in batches. Every step can be repeated, so a run that was
+interrupted, or several workers archiving at once, leave the same result.
+"""
+import asyncio
+import logging
+from datetime import date, datetime, timedelta, timezone
+from typing import Optional
+
+from motor.motor_asyncio import AsyncIOMotorDatabase
+from pymongo.errors import BulkWriteError, PyMongoError
+
+from analytics import rollup
+
+logger = logging.getLogger(__name__)
+
+
+class Archiver:
+    def __init__(
+        self,
+        db: AsyncIOMotorDatabase,
+        horizon_days: int,
+        batch_size: int = 500,
+        interval: float = 3600.0
+    ):
+        self.hot = db.reservations
+        self.archive = db.reservations_archive
+        self.rollups = db.daily_rollups
+        self.occupancy = db.slot_occupancy
+        self.horizon_days = horizon_days
+        self.batch_size = batch_size
+        self.interval = interval
+        self._task: Optional[asyncio.Task] = None
+
+    def cutoff(self) -> str:
+        """Reservations dated before this day are archived."""
+        return (date.today() - timedelta(days=self.horizon_days)).isoformat()
+
+    async def is_archived(self, day: str) -> bool:
+        if day >= self.cutoff():
+            return False
+        return await self.rollups.find_one({"_id": day, "archived_at": {"$exists": True}}, {"_id": 1}) is not None
+
+    async def run_once(self) -> int:
+        """Archive every day before the cutoff; returns the number of days archived."""
+        cutoff = self.cutoff()
+        days = 0
+        while True:
+            oldest = await self.hot.find_one({"date": {"$lt": cutoff}}, {"_id": 0, "date": 1}, sort=[("date", 1)])
+            if oldest is None:
+                return days
+            await self.archive_day(oldest["date"])
+            days += 1
+
+    async def archive_day(self, day: str):
+        # Copy the day to the archive; documents already copied are skipped
+        async for batch in self._batches({"date": day}):
+            try:
+                await self.archive.insert_many(batch, ordered=False)
+            except BulkWriteError as e:
+                if any(error["code"] != 11000 for error in e.details["writeErrors"]):
+                    raise
+
+        # The archive now holds the whole day, even after an interrupted run
+        reservations = await self.archive.find(
+            {"date": day}, {"_id": 0, "time": 1, "guests": 1, "status": 1}
+        ).to_list(None)
+        summary = rollup(reservations)
+        summary["archived_at"] = datetime.now(timezone.utc).isoformat()
+        await self.rollups.update_one({"_id": day}, {"$set": summary}, upsert=True)
+
+        async for batch in self._batches({"date": day}, {"_id": 1}):
+            await self.hot.delete_many({"_id": {"$in": [doc["_id"] for doc in batch]}})
+        # Past days are no longer bookable: drop their occupancy too
+        await self.occupancy.delete_one({"_id": day})
+        logger.info("Archived %s: %d reservations", day, len(reservations))
+
+    async def _batches(self, query: dict, projection: Optional[dict] = None):
+        cursor = self.hot.find(query, projection).batch_size(self.batch_size)
+        batch = []
+        async for doc in cursor:
+            batch.append(doc)
+            if len(batch) == self.batch_size:
+                yield batch
+                batch = []
+        if batch:
+            yield batch
+
+    def start(self):
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+
+    async def _run(self):
+        while True:
+            try:
+                await self.run_once()
+            except PyMongoError:
+                logger.exception("Reservation archival failed, retrying at the next run")
+            await asyncio.sleep(self.interval)
@@ -0,0 +1,90 @@
+"""Incremental parsing of bulk request bodies.
+
+`iter_rows` yields the items of a JSON array or the lines of an NDJSON body
+as the bytes arrive, so only the row being decoded is held in memory.
+"""
+import codecs
+import json
+from typing import Any, AsyncIterator
+
+_WHITESPACE = " \t\r\n"
+_decoder = json.JSONDecoder()
+
+
+def _skip_whitespace(buffer: str, pos: int) -> int:
+    while pos < len(buffer) and buffer[pos] in _WHITESPACE:
+        pos += 1
+    return pos
+
+
+async def _iter_ndjson(chunks: AsyncIterator[bytes]) -> AsyncIterator[Any]:
+    text = codecs.getincrementaldecoder("utf-8")()
+    buffer = ""
+    async for chunk in chunks:
+        buffer += text.decode(chunk)
+        *lines, buffer = buffer.split("\n")
+        for line in lines:
+            if line.strip():
+                yield json.loads(line)
+    buffer += text.decode(b"", final=True)
+    if buffer.strip():
+        yield json.loads(buffer)
+
+
+async def _iter_array(chunks: AsyncIterator[bytes]) -> AsyncIterator[Any]:
+    text = codecs.getincrementaldecoder("utf-8")()
+    buffer = ""
+    # "start" -> expecting "[", "first"/"item" -> expecting a value,
+    # "separator" -> expecting "," or "]", "done" -> only whitespace left
+    state = "start"
+    final = False
+    iterator = chunks.__aiter__()
+    while not final:
+        try:
+            buffer += text.decode(await iterator.__anext__())
+        except StopAsyncIteration:
+            buffer += text.decode(b"", final=True)
+            final = True
+
+        pos = 0
+        while True:
+            pos = _skip_whitespace(buffer, pos)
+            if pos >= len(buffer):
+                break
+            char = buffer[pos]
+            if state == "start":
+                if char != "[":
+                    raise ValueError("Expected a JSON array")
+                state, pos = "first", pos + 1
+            elif state == "first" and char == "]":
+                state, pos = "done", pos + 1
+            elif state in ("first", "item"):
+                try:
+                    item, end = _decoder.raw_decode(buffer, pos)
+                except json.JSONDecodeError:
+                    if final:
+                        raise
+                    break  # the value continues in the next chunk
+                if end == len(buffer) and not final and not isinstance(item, (dict, list)):
+                    break  # a number may continue in the next chunk
+                yield item
+                state, pos = "separator", end
+            elif state == "separator":
+                if char not in ",]":
+                    raise ValueError("Expected ',' or ']' between array items")
+                state, pos = ("item" if char == "," else "done"), pos + 1
+            else:
+                raise ValueError("Unexpected data after the JSON array")
+        buffer = buffer[pos:]
+
+    if state != "done":
+        raise ValueError("Unterminated JSON array")
+
+
+def iter_rows(chunks: AsyncIterator[bytes], ndjson: bool) -> AsyncIterator[Any]:
+    """Decoded rows of a JSON array body, or of an NDJSON body when `ndjson` is set.
+
+    Malformed input raises ValueError once the parser reaches it; the rows
+    before it have already been yielded.
+    """
+    return _iter_ndjson(chunks) if ndjson else _iter_array(chunks)
@@ -0,0 +1,233 @@
+"""Menu, reviews and restaurant info, stored in MongoDB and served from memory.
+
+Each restaurant is one document in db.restaurants, keyed by its slug::
+
+    {"_id": "le-gros-arbre", "version": 3, "info": {...}, "menu": {...}, "reviews": [...],
+     "exceptions": {"2026-12-25": "Fermé"}}
+
+`ContentStore` keeps an immutable `ContentSnapshot` of every restaurant,
+with its payloads pre-encoded (see static_payload.py), so reads are a
+dictionary lookup with no database access. A background task polls the
+version counters and, when one changed, reloads only that restaurant and
+swaps in a new snapshot with a single reference assignment. Edits go
+through `publish`, which bumps the version.
+
+State derived from the content (search indexes, compiled opening hours) is
+built by the `on_swap` listeners before the swap. If any of them rejects the
+new content, the current snapshot and its derived state stay in place and
+the same versions are tried again on the next refresh.
+"""
+import asyncio
+import logging
+from types import MappingProxyType
+from typing import Callable, Dict, List, Mapping, Optional
+
+from motor.motor_asyncio import AsyncIOMotorCollection
+
+from static_payload import StaticPayload
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_SLUG = "le-gros-arbre"
+
+# Menu data
+MENU_DATA = {
+    "entrees": [
+        {"name": "Velouté de butternut", "description": "Crème fraîche, graines de courge torréfiées, huile de noisette", "price": 12},
+        {"name": "Burrata crémeuse", "description": "Tomates anciennes, pesto de basilic frais, huile d'olive extra vierge", "price": 14},
+        {"name": "Tartare de saumon", "description": "Avocat, agrumes, herbes fraîches, toast de pain au levain", "price": 16},
+        {"name": "Œuf parfait 63°", "description": "Crème de champignons, lardons croustillants, mouillettes au beurre", "price": 13},
+    ],
+    "plats": [
+        {"name": "Filet de bœuf Rossini", "description": "Escalope de foie gras poêlée, sauce Périgueux, pommes grenaille", "price": 38},
+        {"name": "Suprême de volaille fermière", "description": "Jus au thym, écrasé de pommes de terre à l'huile de truffe", "price": 28},
+        {"name": "Pavé de cabillaud rôti", "description": "Beurre blanc au citron, légumes de saison, riz sauvage", "price": 32},
+        {"name": "Risotto aux cèpes", "description": "Parmesan 24 mois, huile de truffe noire, roquette", "price": 26},
+    ],
+    "desserts": [
+        {"name": "Fondant au chocolat Valrhona", "description": "Cœur coulant, crème anglaise vanille bourbon", "price": 12},
+        {"name": "Tarte Tatin", "description": "Pommes caramélisées, glace vanille de Madagascar, caramel beurre salé", "price": 11},
+        {"name": "Crème brûlée à la lavande", "description": "Caramel craquant, tuile aux amandes", "price": 10},
+        {"name": "Assiette de fromages affinés", "description": "Sélection du moment, confiture de figues, noix", "price": 14},
+    ],
+    "boissons": [
+        {"name": "Verre de vin rouge (Bordeaux)", "description": "Château sélection du sommelier", "price": 8},
+        {"name": "Verre de vin blanc (Loire)", "description": "Sancerre, notes d'agrumes", "price": 9},
+        {"name": "Cocktail signature Le Gros Arbre", "description": "Gin, sirop de sureau, citron vert, menthe fraîche", "price": 12},
+        {"name": "Café gourmand", "description": "Espresso accompagné de trois mignardises maison", "price": 9},
+    ]
+}
+
+# Reviews data
+REVIEWS_DATA = [
+    {
+        "id": "1",
+        "author": "Noémie Asfaux",
+        "badge": "Local Guide · 24 avis · 48 photos",
+        "text": "Un cadre magnifique, une cuisine faite maison. Je recommande.",
+        "rating": 5
+    },
+    {
+        "id": "2", 
+        "author": "Antoine S",
+        "badge": "Local Guide · 696 avis · 2 771 photos",
+        "text": "Un lieu hors du temps ! Un bout de campagne avec une maison isolée et un cèdre du Liban bicentenaire se mirant dans les eaux du Bassin des Filtres, un ouvrage historique du Canal du Midi",
+        "rating": 5
+    },
+    {
+        "id": "3",
+        "author": "Marie L.",
+        "badge": "25 avis",
+        "text": "Excellente découverte ! L'ambiance est chaleureuse et les plats sont délicieux. Le service est impeccable.",
+        "rating": 5
+    },
+    {
+        "id": "4",
+        "author": "Pierre D.",
+        "badge": "Local Guide · 150 avis",
+        "text": "Un endroit magique au bord de l'eau. La terrasse sous le cèdre est un vrai bonheur. Cuisine raffinée et généreuse.",
+        "rating": 4
+    }
+]
+
+# Restaurant info
+RESTAURANT_INFO = {
+    "name": "Le Gros Arbre",
+    "address": "110 Rue des Amidonniers, 31000 Toulouse",
+    "area": "Bassin des Filtres – Centre-ville",
+    "phone": "07 65 87 29 34",
+    "facebook": "facebook.com",
+    "rating": 4.4,
+    "reviews_count": 558,
+    "price_range": "30-40€",
+    "hours": {
+        "monday": "12:00 - 23:30",
+        "tuesday": "Fermé",
+        "wednesday": "Fermé",
+        "thursday": "12:00 - 23:45",
+        "friday": "12:00 - 23:45",
+        "saturday": "12:00 - 23:45",
+        "sunday": "12:00 - 23:45"
+    },
+    "coordinates": {
+        "lat": 43.6114,
+        "lng": 1.4289
+    }
+}
+
+
+# Content inserted for restaurants missing from the database
+SEED = {
+    DEFAULT_SLUG: {"info": RESTAURANT_INFO, "menu": MENU_DATA, "reviews": REVIEWS_DATA},
+}
+
+
+class RestaurantContent:
+    """One restaurant's content at a given version; treated as read-only."""
+
+    __slots__ = ("slug", "version", "info", "menu", "reviews", "exceptions", "payloads")
+
+    def __init__(self, doc: dict):
+        self.slug = doc["_id"]
+        self.version = doc.get("version", 0)
+        self.info = doc.get("info", {})
+        self.menu = doc.get("menu", {})
+        self.reviews = doc.get("reviews", [])
+        # Dates overriding the weekly opening hours, not served publicly
+        self.exceptions = doc.get("exceptions", {})
+        self.payloads = {
+            "info": StaticPayload(self.info),
+            "menu": StaticPayload(self.menu),
+            "reviews": StaticPayload(self.reviews),
+        }
+
+
+class ContentSnapshot:
+    __slots__ = ("restaurants",)
+
+    def __init__(self, restaurants: Dict[str, RestaurantContent]):
+        self.restaurants: Mapping[str, RestaurantContent] = MappingProxyType(restaurants)
+
+    def versions(self) -> Dict[str, int]:
+        return {slug: restaurant.version for slug, restaurant in self.restaurants.items()}
+
+
+# listener(old, new) builds its state for `new`, raising if it cannot, and
+# returns a function installing that state, called once `new` is swapped in
+SwapListener = Callable[[ContentSnapshot, ContentSnapshot], Optional[Callable[[], None]]]
+
+
+class ContentStore:
+    def __init__(self, collection: AsyncIOMotorCollection, refresh_interval: float = 5.0):
+        self.collection = collection
+        self.refresh_interval = refresh_interval
+        self.snapshot = ContentSnapshot({})
+        self._listeners: List[SwapListener] = []
+        self._task: Optional[asyncio.Task] = None
+
+    def restaurant(self, slug: str) -> Optional[RestaurantContent]:
+        return self.snapshot.restaurants.get(slug)
+
+    def on_swap(self, listener: SwapListener):
+        """Call `listener(old, new)` before every snapshot swap, and what it returns after it."""
+        self._listeners.append(listener)
+
+    async def seed(self):
+        for slug, content in SEED.items():
+            await self.collection.update_one(
+                {"_id": slug},
+                {"$setOnInsert": {**content, "version": 1}},
+                upsert=True
+            )
+
+    async def refresh(self) -> bool:
+        """Reload the restaurants whose version changed; returns whether the snapshot was swapped."""
+        current = self.snapshot
+        versions = {doc["_id"]: doc.get("version", 0) async for doc in self.collection.find({}, {"version": 1})}
+        if versions == current.versions():
+            return False
+
+        changed = [slug for slug, version in versions.items()
+                   if slug not in current.restaurants or current.restaurants[slug].version != version]
+        restaurants = {slug: current.restaurants[slug] for slug in versions if slug not in changed}
+        async for doc in self.collection.find({"_id": {"$in": changed}}):
+            restaurants[doc["_id"]] = RestaurantContent(doc)
+
+        snapshot = ContentSnapshot(restaurants)
+        # Raises before anything is swapped, so the versions are retried next time
+        installs = [listener(current, snapshot) for listener in self._listeners]
+        self.snapshot = snapshot
+        for install in installs:
+            if install is not None:
+                install()
+        return True
+
+    def start(self):
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.refresh_interval)
+            try:
+                if await self.refresh():
+                    logger.info("Content snapshot reloaded: %s", self.snapshot.versions())
+            except Exception:
+                logger.exception("Content refresh failed, keeping the current snapshot")
+
+
+async def publish(collection: AsyncIOMotorCollection, slug: str, **fields):
+    """Update a restaurant's info, menu, reviews and/or exceptions and bump its version.
+
+    Workers pick the change up on their next refresh, e.g.::
+
+        await publish(db.restaurants, "le-gros-arbre", menu=new_menu)
+    """
+    await collection.update_one({"_id": slug}, {"$set": fields, "$inc": {"version": 1}}, upsert=True)
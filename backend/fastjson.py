@@ -0,0 +1,30 @@
+"""Fast JSON encoding for documents that were validated when they were written.
+
+Read routes that return stored documents as-is use `TrustedJSONResponse`
+to skip FastAPI's response_model re-validation and serialisation (the route
+keeps its response_model, so the OpenAPI schema is unchanged). orjson is
+used when installed, with the standard library as a fallback.
+"""
+import json
+
+from starlette.responses import Response
+
+try:
+    import orjson
+except ImportError:  # orjson is optional
+    orjson = None
+
+
+if orjson is not None:
+    def dumps(content) -> bytes:
+        return orjson.dumps(content)
+else:
+    def dumps(content) -> bytes:
+        return json.dumps(content, ensure_ascii=False, separators=(",", ":")).encode()
+
+
+class TrustedJSONResponse(Response):
+    media_type = "application/json"
+
+    def render(self, content) -> bytes:
+        return dumps(content)
@@ -0,0 +1,113 @@
+"""Finding reservations by guest details.
+
+Every stored reservation carries normalised copies of the guest's details,
+which are indexed together with the date:
+
+- ``email_norm``: trimmed and case-folded;
+- ``phone_digits``: digits only, with +33 / 0033 rewritten to a leading 0
+  (dropping the trunk 0 sometimes written after it), so "07 65 87 29 34",
+  "07.65.87.29.34", "+33 7 65 87 29 34" and "+33 (0)7 65 87 29 34" all
+  become "0765872934";
+- ``name_tokens``: the words of the name, accent-insensitive (see
+  menu_search.fold), so "Dupont" or "dup" find "Jean Dupont".
+
+`search_query` turns the filters of the search route into a query on those
+fields; `backfill` adds them to reservations stored before they existed, and
+fixes phone numbers stored with a doubled trunk 0 by earlier versions.
+"""
+import logging
+import re
+from typing import Optional
+
+from motor.motor_asyncio import AsyncIOMotorCollection
+from pymongo import UpdateOne
+
+from menu_search import tokens
+
+logger = logging.getLogger(__name__)
+
+BACKFILL_BATCH_SIZE = 500
+
+_NON_DIGITS = re.compile(r"\D")
+
+# Documents without the lookup fields, or with a "+33 (0)..." number stored as
+# "00" and nine digits (international numbers are longer)
+BACKFILL_QUERY = {"$or": [{"phone_digits": {"$exists": False}}, {"phone_digits": re.compile(r"^00[1-9]\d{8}$")}]}
+
+
+def normalise_email(email: str) -> str:
+    return email.strip().casefold()
+
+
+def phone_digits(phone: str) -> str:
+    digits = _NON_DIGITS.sub("", phone)
+    if phone.strip().startswith("+33"):
+        national = digits[2:]
+    elif digits.startswith("0033"):
+        national = digits[4:]
+    else:
+        return digits
+    # "+33 (0)7 ..." also writes the trunk 0
+    if national.startswith("0"):
+        national = national[1:]
+    return "0" + national
+
+
+def lookup_fields(name: str, email: str, phone: str) -> dict:
+    return {
+        "email_norm": normalise_email(email),
+        "phone_digits": phone_digits(phone),
+        "name_tokens": tokens(name),
+    }
+
+
+def search_query(
+    email: Optional[str] = None,
+    phone: Optional[str] = None,
+    name: Optional[str] = None,
+    date_from: Optional[str] = None,
+    date_to: Optional[str] = None,
+    status: Optional[str] = None
+) -> dict:
+    """Query on the lookup fields; raises ValueError for a name without any word."""
+    query = {}
+    if email:
+        query["email_norm"] = normalise_email(email)
+    if phone:
+        query["phone_digits"] = phone_digits(phone)
+    if name:
+        words = tokens(name)
+        if not words:
+            raise ValueError("name must contain letters or digits")
+        # Every word must start one of the name's words; anchored patterns use the index
+        query["$and"] = [{"name_tokens": re.compile("^" + re.escape(word))} for word in words]
+    if date_from or date_to:
+        query["date"] = {}
+        if date_from:
+            query["date"]["$gte"] = date_from
+        if date_to:
+            query["date"]["$lte"] = date_to
+    if status:
+        query["status"] = status
+    return query
+
+
+async def backfill(collection: AsyncIOMotorCollection) -> int:
+    """Add the lookup fields to the reservations missing them; returns how many were updated."""
+    cursor = collection.find(
+        BACKFILL_QUERY, {"_id": 1, "name": 1, "email": 1, "phone": 1}
+    )
+    updated, batch = 0, []
+    async for doc in cursor:
+        fields = lookup_fields(doc.get("name", ""), doc.get("email", ""), doc.get("phone", ""))
+        batch.append(UpdateOne({"_id": doc["_id"]}, {"$set": fields}))
+        if len(batch) == BACKFILL_BATCH_SIZE:
+            await collection.bulk_write(batch, ordered=False)
+            updated += len(batch)
+            batch = []
+    if batch:
+        await collection.bulk_write(batch, ordered=False)
+        updated += len(batch)
+    if updated:
+        logger.info("Added lookup fields to %d documents of %s", updated, collection.name)
+    return updated
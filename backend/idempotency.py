@@ -0,0 +1,132 @@
+"""Idempotency-Key support for POST endpoints.
+
+The first request with a key claims it in db.idempotency_keys (expired by a
+TTL index) and stores its response once the handler succeeds; a retry with
+the same key gets that stored response back instead of running the handler
+again. Completed responses are also kept in an in-process LRU, so repeated
+retries on the same worker never reach MongoDB.
+
+A claim is a lease: a key still pending after `lease_seconds` (its worker
+died mid-request) is taken over by the next retry instead of answering 409
+until the key expires. Storing the response is retried; if it still fails,
+the response is served from the LRU rather than failing a request whose
+work is done.
+"""
+import asyncio
+import hashlib
+import logging
+import uuid
+from collections import OrderedDict
+from datetime import datetime, timedelta, timezone
+from typing import Awaitable, Callable, Optional
+
+from fastapi import HTTPException
+from motor.motor_asyncio import AsyncIOMotorCollection
+from pydantic import BaseModel
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError, PyMongoError
+
+logger = logging.getLogger(__name__)
+
+# Stored keys expire after this many seconds (TTL index in indexes.py)
+KEY_TTL_SECONDS = 24 * 3600
+MAX_KEY_LENGTH = 255
+COMPLETION_RETRIES = 3
+
+
+class IdempotencyStore:
+    def __init__(self, collection: AsyncIOMotorCollection, cache_size: int = 10_000, lease_seconds: float = 60.0):
+        self.collection = collection
+        self.cache_size = cache_size
+        self.lease = timedelta(seconds=lease_seconds)
+        self._cache: "OrderedDict[str, dict]" = OrderedDict()
+
+    def _remember(self, cache_key: str, record: dict):
+        self._cache[cache_key] = record
+        self._cache.move_to_end(cache_key)
+        if len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+
+    def _check(self, record: dict, fingerprint: str):
+        if record["fingerprint"] != fingerprint:
+            raise HTTPException(status_code=422, detail="Idempotency-Key was already used with a different request")
+
+    def _replay(self, record: dict, fingerprint: str) -> dict:
+        self._check(record, fingerprint)
+        return record["response"]
+
+    async def run(
+        self,
+        scope: str,
+        key: Optional[str],
+        payload: BaseModel,
+        handler: Callable[[], Awaitable[BaseModel]]
+    ):
+        """Run `handler` once per (scope, key) and return its result, or the stored one on a retry."""
+        if key is None:
+            return await handler()
+        if not key or len(key) > MAX_KEY_LENGTH:
+            raise HTTPException(status_code=422, detail=f"Idempotency-Key must be 1-{MAX_KEY_LENGTH} characters")
+
+        cache_key = f"{scope}:{key}"
+        fingerprint = hashlib.sha256(payload.model_dump_json().encode()).hexdigest()
+        cached = self._cache.get(cache_key)
+        if cached is not None:
+            self._cache.move_to_end(cache_key)
+            return self._replay(cached, fingerprint)
+
+        claim = uuid.uuid4().hex
+        now = datetime.now(timezone.utc)
+        try:
+            await self.collection.insert_one({
+                "_id": cache_key,
+                "fingerprint": fingerprint,
+                "status": "pending",
+                "claim": claim,
+                "pending_until": now + self.lease,
+                "created_at": now
+            })
+        except DuplicateKeyError:
+            record = await self.collection.find_one({"_id": cache_key})
+            if record is not None and record["status"] == "completed":
+                self._remember(cache_key, record)
+                return self._replay(record, fingerprint)
+            if record is not None:
+                self._check(record, fingerprint)
+            # Take over a claim whose lease ran out; keys stored before leases have none
+            record = await self.collection.find_one_and_update(
+                {"_id": cache_key, "status": "pending", "$or": [
+                    {"pending_until": {"$lte": now}}, {"pending_until": {"$exists": False}}
+                ]},
+                {"$set": {"fingerprint": fingerprint, "claim": claim, "pending_until": now + self.lease}},
+                return_document=ReturnDocument.AFTER
+            )
+            if record is None:
+                raise HTTPException(status_code=409, detail="A request with this Idempotency-Key is in progress")
+
+        try:
+            result = await handler()
+        except BaseException:
+            # Release the key so the client can retry a request that failed
+            await self.collection.delete_one({"_id": cache_key, "claim": claim})
+            raise
+
+        response = result.model_dump()
+        self._remember(cache_key, {"fingerprint": fingerprint, "response": response})
+        await self._complete(cache_key, claim, response)
+        return result
+
+    async def _complete(self, cache_key: str, claim: str, response: dict):
+        for attempt in range(1, COMPLETION_RETRIES + 1):
+            try:
+                await self.collection.update_one(
+                    {"_id": cache_key, "claim": claim},
+                    {"$set": {"status": "completed", "response": response}, "$unset": {"pending_until": ""}}
+                )
+                return
+            except PyMongoError:
+                if attempt == COMPLETION_RETRIES:
+                    # The work is done: answer from the LRU rather than with a 500
+                    logger.exception("Could not store the response of Idempotency-Key %s", cache_key)
+                    return
+                await asyncio.sleep(0.05 * 2 ** attempt)
@@ -0,0 +1,154 @@
+"""Index declarations and query-plan checks for the API's MongoDB queries.
+
+`ensure_indexes` is run at startup. `find_collscans` explains the query shape
+of every route and reports the ones MongoDB would still answer with a
+collection scan; it is meant for tests and deploy checks::
+
+    python indexes.py    # exits non-zero if any route query does a COLLSCAN
+"""
+import asyncio
+import os
+import re
+from pathlib import Path
+from typing import Dict, List
+
+from dotenv import load_dotenv
+from motor.motor_asyncio import AsyncIOMotorDatabase
+from pymongo import ASCENDING, IndexModel
+
+import guest_lookup
+from idempotency import KEY_TTL_SECONDS
+
+# Guest search on normalised details, by date (see guest_lookup.py)
+GUEST_LOOKUP_INDEXES = [
+    IndexModel([("email_norm", ASCENDING), ("date", ASCENDING), ("time", ASCENDING)], name="email_norm_date"),
+    IndexModel([("phone_digits", ASCENDING), ("date", ASCENDING), ("time", ASCENDING)], name="phone_digits_date"),
+    IndexModel([("name_tokens", ASCENDING), ("date", ASCENDING), ("time", ASCENDING)], name="name_tokens_date"),
+]
+
+INDEXES: Dict[str, List[IndexModel]] = {
+    "reservations": [
+        IndexModel([("id", ASCENDING)], name="id_unique", unique=True),
+        IndexModel([("date", ASCENDING), ("time", ASCENDING)], name="date_time"),
+        IndexModel([("created_at", ASCENDING), ("id", ASCENDING)], name="created_at_id"),
+        *GUEST_LOOKUP_INDEXES,
+        # Notifications not yet relayed to db.outbox, only on the few documents having some
+        IndexModel([("outbox.at", ASCENDING)], name="outbox_pending",
+                   partialFilterExpression={"outbox": {"$exists": True}}),
+    ],
+    # Same shape as reservations, so archived days are listed the same way
+    "reservations_archive": [
+        IndexModel([("id", ASCENDING)], name="id_unique", unique=True),
+        IndexModel([("date", ASCENDING), ("time", ASCENDING)], name="date_time"),
+        IndexModel([("created_at", ASCENDING), ("id", ASCENDING)], name="created_at_id"),
+        *GUEST_LOOKUP_INDEXES,
+    ],
+    "contact_messages": [
+        IndexModel([("id", ASCENDING)], name="id_unique", unique=True),
+    ],
+    "idempotency_keys": [
+        IndexModel([("created_at", ASCENDING)], name="created_at_ttl", expireAfterSeconds=KEY_TTL_SECONDS),
+    ],
+    "outbox": [
+        IndexModel([("status", ASCENDING), ("available_at", ASCENDING)], name="status_available_at"),
+        IndexModel([("status", ASCENDING), ("lease_until", ASCENDING)], name="status_lease_until"),
+        IndexModel([("claim", ASCENDING)], name="claim", sparse=True),
+        IndexModel([("done_at", ASCENDING)], name="done_at_ttl", expireAfterSeconds=7 * 24 * 3600),
+    ],
+    # Days whose archival completed, read by `Rollups.rebuild`
+    "daily_rollups": [
+        IndexModel([("archived_at", ASCENDING)], name="archived_at", sparse=True),
+    ],
+    "rate_limits": [
+        IndexModel([("expires_at", ASCENDING)], name="expires_at_ttl", expireAfterSeconds=0),
+    ],
+}
+
+# Representative query of each route: (name, collection, filter, sort)
+ROUTE_QUERIES = [
+    ("get_reservation", "reservations", {"id": "x"}, None),
+    ("cancel_reservation", "reservations", {"id": "x"}, None),
+    ("mark_no_show", "reservations", {"id": "x", "status": "confirmed"}, None),
+    ("get_reservations", "reservations", {}, [("created_at", 1), ("id", 1)]),
+    ("get_reservations?date", "reservations", {"date": "2026-01-01"}, [("created_at", 1), ("id", 1)]),
+    ("get_reservations?status", "reservations", {"status": "confirmed"}, [("created_at", 1), ("id", 1)]),
+    ("get_reservations?date&status", "reservations", {"date": "2026-01-01", "status": "confirmed"},
+     [("created_at", 1), ("id", 1)]),
+    ("get_reservations?cursor", "reservations", {"$or": [
+        {"created_at": {"$gt": "2026-01-01"}},
+        {"created_at": "2026-01-01", "id": {"$gt": "x"}},
+    ]}, [("created_at", 1), ("id", 1)]),
+    ("get_reservation (archive)", "reservations_archive", {"id": "x"}, None),
+    ("get_reservations?date (archive)", "reservations_archive", {"date": "2026-01-01"}, [("created_at", 1), ("id", 1)]),
+    ("search_reservations?email", "reservations", {"email_norm": "a@b.fr", "date": {"$gte": "2026-01-01"}}, [("date", 1), ("time", 1)]),
+    ("search_reservations?phone", "reservations", {"phone_digits": "0765872934"}, [("date", 1), ("time", 1)]),
+    ("search_reservations?name", "reservations", {"$and": [{"name_tokens": re.compile("^dup")}]}, [("date", 1), ("time", 1)]),
+    ("backfill_guest_lookup", "reservations", guest_lookup.BACKFILL_QUERY, None),
+    ("rebuild_slot_occupancy", "reservations", {"status": {"$ne": "cancelled"}}, [("date", 1)]),
+    ("archive_run", "reservations", {"date": {"$lt": "2026-01-01"}}, [("date", 1)]),
+    ("archive_day", "reservations", {"date": "2026-01-01"}, None),
+    ("archive_rollup", "reservations_archive", {"date": "2026-01-01"}, None),
+    ("import_batch (cleanup)", "reservations", {"id": {"$in": ["x", "y"]}}, None),
+    ("rebuild_rollups", "reservations", {}, [("date", 1)]),
+    ("rebuild_rollups (archive)", "reservations_archive", {}, [("date", 1)]),
+    ("rebuild_rollups (archived days)", "daily_rollups", {"archived_at": {"$exists": True}}, None),
+    ("outbox_claim", "outbox", {"$or": [
+        {"status": "pending", "available_at": {"$lte": "2026-01-01"}},
+        {"status": "running", "lease_until": {"$lte": "2026-01-01"}},
+    ]}, [("available_at", 1)]),
+    ("outbox_claimed", "outbox", {"claim": "x"}, None),
+    ("outbox_relay", "reservations", {"outbox": {"$exists": True}}, [("outbox.at", 1)]),
+    ("get_analytics", "daily_rollups", {"_id": {"$gte": "2026-01-01", "$lte": "2026-03-31"}}, None),
+    ("get_available_times", "slot_occupancy", {"_id": "2026-01-01"}, None),
+    ("get_availability", "slot_occupancy", {"_id": {"$in": ["2026-01-01", "2026-01-02"]}}, None),
+]
+
+
+async def ensure_indexes(db: AsyncIOMotorDatabase):
+    for collection, indexes in INDEXES.items():
+        await db[collection].create_indexes(indexes)
+
+
+def _stages(plan) -> List[str]:
+    if isinstance(plan, dict):
+        stages = [plan["stage"]] if "stage" in plan else []
+        for value in plan.values():
+            stages.extend(_stages(value))
+        return stages
+    if isinstance(plan, list):
+        return [stage for item in plan for stage in _stages(item)]
+    return []
+
+
+async def find_collscans(db: AsyncIOMotorDatabase) -> List[str]:
+    """Names of the route queries whose winning plan contains a COLLSCAN."""
+    offenders = []
+    for name, collection, query, sort in ROUTE_QUERIES:
+        cursor = db[collection].find(query)
+        if sort:
+            cursor = cursor.sort(sort)
+        explain = await cursor.explain()
+        if "COLLSCAN" in _stages(explain["queryPlanner"]["winningPlan"]):
+            offenders.append(name)
+    return offenders
+
+
+async def verify_query_plans(db: AsyncIOMotorDatabase):
+    offenders = await find_collscans(db)
+    if offenders:
+        raise AssertionError(f"Queries doing a collection scan: {', '.join(offenders)}")
+
+
+async def _main():
+    from motor.motor_asyncio import AsyncIOMotorClient
+
+    load_dotenv(Path(__file__).parent / '.env')
+    client = AsyncIOMotorClient(os.environ['MONGO_URL'])
+    db = client[os.environ['DB_NAME']]
+    await ensure_indexes(db)
+    await verify_query_plans(db)
+    print("All route queries use an index")
+
+
+if __name__ == "__main__":
+    asyncio.run(_main())
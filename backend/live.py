@@ -0,0 +1,238 @@
+"""Live availability pushed to browsers with Server-Sent Events.
+
+Clients subscribe to a date and party size. They receive the bookable slots
+once as a ``snapshot`` event, then a ``diff`` event listing the slots that
+opened or closed whenever a booking or cancellation changes that date.
+
+`AvailabilityBroadcaster.notify(date)` is called after every change. Changes
+to one date are coalesced: a single task reloads the date once, computes the
+slots for every party size being watched, and encodes each diff once for all
+of its subscribers. The database load is therefore per change, not per open
+tab.
+
+An idle subscriber is a small bounded queue and a suspended generator. A
+subscriber that falls behind is disconnected, and EventSource reconnects it
+with a fresh snapshot.
+
+`watch` optionally follows a change stream on the occupancy collection, so
+that changes made by other workers are pushed too. This needs a replica set.
+"""
+import asyncio
+import logging
+from typing import Awaitable, Callable, Dict, Iterable, List, Optional, Set, Tuple
+
+from motor.motor_asyncio import AsyncIOMotorCollection
+from pymongo.errors import PyMongoError
+
+import fastjson
+
+logger = logging.getLogger(__name__)
+
+# {"lunch": [...], "dinner": [...]}
+Slots = Dict[str, List[str]]
+Loader = Callable[[str, Iterable[int]], Awaitable[Dict[int, Slots]]]
+
+KEEPALIVE_SECONDS = 15.0
+
+
+class SubscriberLimit(Exception):
+    pass
+
+
+def _event(name: str, data: dict) -> bytes:
+    return b"event: " + name.encode() + b"\ndata: " + fastjson.dumps(data) + b"\n\n"
+
+
+def _diff(old: Slots, new: Slots) -> Tuple[List[str], List[str]]:
+    before = set(old["lunch"]) | set(old["dinner"])
+    after = new["lunch"] + new["dinner"]
+    opened = [time for time in after if time not in before]
+    now = set(after)
+    closed = sorted(time for time in before if time not in now)
+    return opened, closed
+
+
+class Subscription:
+    __slots__ = ("date", "guests", "queue", "dropped")
+
+    def __init__(self, date: str, guests: int, max_queue: int):
+        self.date = date
+        self.guests = guests
+        self.queue: asyncio.Queue = asyncio.Queue(max_queue)
+        self.dropped = False
+
+    def push(self, message: bytes):
+        if self.dropped:
+            return
+        try:
+            self.queue.put_nowait(message)
+        except asyncio.QueueFull:
+            # Too slow to keep up: close the stream and let the client resync
+            self.end()
+
+    def end(self):
+        self.dropped = True
+        while not self.queue.empty():
+            self.queue.get_nowait()
+        self.queue.put_nowait(None)
+
+
+class AvailabilityBroadcaster:
+    def __init__(
+        self,
+        load: Loader,
+        max_subscribers: int = 10_000,
+        max_queue: int = 16,
+        keepalive: float = KEEPALIVE_SECONDS
+    ):
+        self.load = load
+        self.max_subscribers = max_subscribers
+        self.max_queue = max_queue
+        self.keepalive = keepalive
+        self.count = 0
+        # date -> guests -> subscriptions, and the slots they last received
+        self._subscribers: Dict[str, Dict[int, Set[Subscription]]] = {}
+        self._state: Dict[Tuple[str, int], Slots] = {}
+        # Dates with a reload running, and those changed again meanwhile
+        self._refreshing: Dict[str, asyncio.Task] = {}
+        self._dirty: Set[str] = set()
+        self._watcher: Optional[asyncio.Task] = None
+        # Counts notify() calls, to detect changes during a subscriber's first load
+        self._changes = 0
+
+    def check_capacity(self):
+        """Raise SubscriberLimit if a new subscriber would go over `max_subscribers`."""
+        if self.count >= self.max_subscribers:
+            raise SubscriberLimit()
+
+    async def subscribe(self, date: str, guests: int) -> Subscription:
+        self.check_capacity()
+        key = (date, guests)
+        changes = self._changes
+        if key not in self._state:
+            slots = (await self.load(date, [guests]))[guests]
+            # A concurrent reload may have filled it in while we waited
+            self._state.setdefault(key, slots)
+        # No await from here on, so the snapshot and later diffs line up
+        subscription = Subscription(date, guests, self.max_queue)
+        subscription.push(_event("snapshot", {"date": date, "guests": guests, **self._state[key]}))
+        self._subscribers.setdefault(date, {}).setdefault(guests, set()).add(subscription)
+        self.count += 1
+        if self._changes != changes:
+            # Something changed while loading: the snapshot may be stale
+            self.notify(date)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription):
+        by_guests = self._subscribers.get(subscription.date, {})
+        subscriptions = by_guests.get(subscription.guests)
+        if not subscriptions or subscription not in subscriptions:
+            return
+        subscriptions.discard(subscription)
+        self.count -= 1
+        if not subscriptions:
+            del by_guests[subscription.guests]
+            self._state.pop((subscription.date, subscription.guests), None)
+        if not by_guests:
+            del self._subscribers[subscription.date]
+
+    def notify(self, date: str):
+        """Schedule a push of the slots of `date` to its subscribers."""
+        self._changes += 1
+        if date not in self._subscribers:
+            return
+        if date in self._refreshing:
+            self._dirty.add(date)
+            return
+        self._refreshing[date] = asyncio.create_task(self._refresh(date))
+
+    def notify_all(self):
+        for date in list(self._subscribers):
+            self.notify(date)
+
+    async def _refresh(self, date: str):
+        try:
+            while True:
+                self._dirty.discard(date)
+                by_guests = self._subscribers.get(date)
+                if not by_guests:
+                    return
+                try:
+                    loaded = await self.load(date, list(by_guests))
+                except Exception:
+                    logger.exception("Could not reload availability of %s", date)
+                    return
+                for guests, slots in loaded.items():
+                    self._publish(date, guests, slots)
+                if date not in self._dirty:
+                    return
+        finally:
+            self._refreshing.pop(date, None)
+
+    def _publish(self, date: str, guests: int, slots: Slots):
+        subscriptions = self._subscribers.get(date, {}).get(guests)
+        old = self._state.get((date, guests))
+        if not subscriptions or old is None:
+            return
+        self._state[date, guests] = slots
+        opened, closed = _diff(old, slots)
+        if not opened and not closed:
+            return
+        message = _event("diff", {"opened": opened, "closed": closed})
+        for subscription in list(subscriptions):
+            subscription.push(message)
+
+    async def stream(self, date: str, guests: int):
+        """SSE body for a date and party size; ends when the client goes away or falls behind.
+
+        The subscription is taken on the first iteration, so a body that is
+        never sent holds none, and released when the generator finishes.
+        """
+        try:
+            subscription = await self.subscribe(date, guests)
+        except SubscriberLimit:
+            # Filled up since the route checked: EventSource retries later
+            return
+        try:
+            while True:
+                try:
+                    message = await asyncio.wait_for(subscription.queue.get(), self.keepalive)
+                except asyncio.TimeoutError:
+                    # Keeps proxies from closing an idle connection
+                    yield b": keepalive\n\n"
+                    continue
+                if message is None:
+                    return
+                yield message
+        finally:
+            self.unsubscribe(subscription)
+
+    def watch(self, collection: AsyncIOMotorCollection):
+        """Also push changes to `collection` made by other processes (needs a replica set)."""
+        self._watcher = asyncio.create_task(self._watch(collection))
+
+    async def _watch(self, collection: AsyncIOMotorCollection):
+        while True:
+            try:
+                async with collection.watch() as changes:
+                    async for change in changes:
+                        self.notify(change["documentKey"]["_id"])
+            except asyncio.CancelledError:
+                raise
+            except PyMongoError:
+                logger.exception("Occupancy change stream failed, reopening")
+                await asyncio.sleep(1)
+
+    async def close(self):
+        if self._watcher is not None:
+            self._watcher.cancel()
+            try:
+                await self._watcher
+            except asyncio.CancelledError:
+                pass
+        for task in list(self._refreshing.values()):
+            task.cancel()
+        for by_guests in self._subscribers.values():
+            for subscriptions in by_guests.values():
+                for subscription in subscriptions:
+                    subscription.end()
@@ -0,0 +1,117 @@
+"""Accent-insensitive menu search.
+
+Names and descriptions are folded (accents stripped, ligatures such as
+œ/æ expanded, case-folded) and split into tokens. `MenuIndex` keeps an
+inverted index from token to items plus a sorted vocabulary, so every query
+word is matched as a prefix with two binary searches: "veloute" finds
+"Velouté", "boeuf" finds "bœuf", "crem" finds "Crème" and "crémeuse".
+
+`MenuIndex.update` applies a new version of the menu by re-indexing only
+the items that were added, removed or changed.
+"""
+import re
+import unicodedata
+from bisect import bisect_left
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+_LIGATURES = str.maketrans({"œ": "oe", "Œ": "OE", "æ": "ae", "Æ": "AE"})
+_TOKEN = re.compile(r"[a-z0-9]+")
+
+ItemKey = Tuple[str, str]  # (category, item name)
+
+
+def fold(text: str) -> str:
+    decomposed = unicodedata.normalize("NFKD", text.translate(_LIGATURES))
+    return "".join(char for char in decomposed if not unicodedata.combining(char)).casefold()
+
+
+def tokens(text: str) -> List[str]:
+    return _TOKEN.findall(fold(text))
+
+
+def _item_tokens(item: dict) -> Set[str]:
+    return set(tokens(f"{item.get('name', '')} {item.get('description', '')}"))
+
+
+class MenuIndex:
+    def __init__(self, menu: Optional[dict] = None):
+        self.items: Dict[ItemKey, dict] = {}
+        self.postings: Dict[str, Set[ItemKey]] = {}
+        self.vocabulary: List[str] = []
+        # Menu position of each item, for returning results in menu order
+        self.order: Dict[ItemKey, int] = {}
+        self.update(menu or {})
+
+    def _add(self, key: ItemKey, item: dict):
+        self.items[key] = item
+        for token in _item_tokens(item):
+            self.postings.setdefault(token, set()).add(key)
+
+    def _remove(self, key: ItemKey):
+        item = self.items.pop(key)
+        for token in _item_tokens(item):
+            keys = self.postings[token]
+            keys.discard(key)
+            if not keys:
+                del self.postings[token]
+
+    def copy(self) -> "MenuIndex":
+        """An independent index with the same content, to update without touching this one."""
+        index = MenuIndex()
+        index.items = dict(self.items)
+        index.postings = {token: set(keys) for token, keys in self.postings.items()}
+        index.vocabulary = list(self.vocabulary)
+        index.order = dict(self.order)
+        return index
+
+    def update(self, menu: dict):
+        """Bring the index in line with `menu`, touching only the items that differ."""
+        new_items = {
+            (category, item.get("name", "")): item
+            for category, items in menu.items()
+            for item in items
+        }
+        for key in [key for key, item in self.items.items() if new_items.get(key) != item]:
+            self._remove(key)
+        for key, item in new_items.items():
+            if key not in self.items:
+                self._add(key, item)
+        self.vocabulary = sorted(self.postings)
+        self.order = {key: position for position, key in enumerate(new_items)}
+
+    def _prefix_matches(self, prefix: str) -> Set[ItemKey]:
+        matches: Set[ItemKey] = set()
+        start = bisect_left(self.vocabulary, prefix)
+        # Every token starting with the prefix sorts before prefix + U+FFFF
+        end = bisect_left(self.vocabulary, prefix + "\uffff", start)
+        for token in self.vocabulary[start:end]:
+            matches |= self.postings[token]
+        return matches
+
+    def search(
+        self,
+        query: str = "",
+        category: Optional[str] = None,
+        min_price: Optional[float] = None,
+        max_price: Optional[float] = None
+    ) -> List[dict]:
+        """Items matching every word of `query` (as prefixes) and the filters, in menu order."""
+        keys: Iterable[ItemKey] = self.items
+        for word in tokens(query):
+            matches = self._prefix_matches(word)
+            keys = matches if keys is self.items else keys & matches
+            if not keys:
+                return []
+
+        results = []
+        for key in sorted(keys, key=self.order.__getitem__):
+            item = self.items[key]
+            price = item.get("price")
+            if category is not None and key[0] != category:
+                continue
+            if min_price is not None and (price is None or price < min_price):
+                continue
+            if max_price is not None and (price is None or price > max_price):
+                continue
+            results.append({"category": key[0], **item})
+        return results
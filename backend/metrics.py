@@ -0,0 +1,260 @@
+"""In-process metrics exposed in the Prometheus text format.
+
+- `MetricsMiddleware` records per-route latency histograms and in-flight
+  gauges, labelled with the route template rather than the raw path.
+- `MongoCommandListener` is a pymongo command listener timing every
+  command per collection and operation. Motor runs commands with a copy of
+  the caller's context, so the listener also adds each command's duration to
+  the current request's `RequestTimings`.
+- Requests slower than `slow_request_ms` are logged with that breakdown;
+  whatever is not spent in MongoDB is FastAPI routing, Pydantic validation,
+  serialisation and handler code.
+
+Metrics are per worker process, as with any in-process exporter.
+"""
+import logging
+import threading
+import time
+from contextvars import ContextVar
+from typing import Dict, Optional, Sequence, Tuple
+
+from pymongo import monitoring
+from starlette.routing import Match
+
+logger = logging.getLogger(__name__)
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+MONGO_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 5.0)
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def render(self) -> str:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        lines.extend(self._samples())
+        return "\n".join(lines)
+
+    def _samples(self):
+        raise NotImplementedError
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, name, help, labelnames=()):
+        super().__init__(name, help, labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, *labels: str, amount: float = 1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def _samples(self):
+        with self._lock:
+            values = dict(self._values)
+        return [f"{self.name}{_labels(self.labelnames, labels)} {value}" for labels, value in values.items()]
+
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def set(self, value: float, *labels: str):
+        with self._lock:
+            self._values[labels] = value
+
+    def dec(self, *labels: str, amount: float = 1):
+        self.inc(*labels, amount=-amount)
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name, help, labelnames=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, help, labelnames)
+        self.buckets = tuple(buckets)
+        # labels -> [count per bucket..., +Inf count, sum]
+        self._values: Dict[Tuple[str, ...], list] = {}
+
+    def observe(self, value: float, *labels: str):
+        with self._lock:
+            entry = self._values.get(labels)
+            if entry is None:
+                entry = self._values[labels] = [0] * (len(self.buckets) + 1) + [0.0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    entry[i] += 1
+                    break
+            else:
+                entry[len(self.buckets)] += 1
+            entry[-1] += value
+
+    def _samples(self):
+        with self._lock:
+            values = {labels: list(entry) for labels, entry in self._values.items()}
+        lines = []
+        for labels, entry in values.items():
+            cumulative = 0
+            for bound, count in zip(self.buckets + ("+Inf",), entry):
+                cumulative += count
+                le = 'le="%s"' % (bound if bound == "+Inf" else repr(float(bound)))
+                lines.append(f"{self.name}_bucket{_labels(self.labelnames, labels, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_labels(self.labelnames, labels)} {entry[-1]}")
+            lines.append(f"{self.name}_count{_labels(self.labelnames, labels)} {cumulative}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self.metrics = []
+
+    def register(self, metric):
+        self.metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        return "\n".join(metric.render() for metric in self.metrics) + "\n"
+
+
+REGISTRY = Registry()
+
+http_request_duration = REGISTRY.register(Histogram(
+    "http_request_duration_seconds", "HTTP request latency by route template",
+    ("method", "route", "status")
+))
+http_requests_in_flight = REGISTRY.register(Gauge(
+    "http_requests_in_flight", "HTTP requests currently being handled",
+    ("method", "route")
+))
+mongo_command_duration = REGISTRY.register(Histogram(
+    "mongodb_command_duration_seconds", "MongoDB command latency by collection and operation",
+    ("collection", "command"), MONGO_BUCKETS
+))
+mongo_command_failures = REGISTRY.register(Counter(
+    "mongodb_command_failures_total", "MongoDB commands that failed",
+    ("collection", "command")
+))
+
+
+class RequestTimings:
+    """MongoDB time spent on behalf of one request."""
+
+    __slots__ = ("commands",)
+
+    def __init__(self):
+        # (collection, command) -> [count, seconds]
+        self.commands: Dict[Tuple[str, str], list] = {}
+
+    def add(self, collection: str, command: str, seconds: float):
+        entry = self.commands.setdefault((collection, command), [0, 0.0])
+        entry[0] += 1
+        entry[1] += seconds
+
+    @property
+    def mongo_seconds(self) -> float:
+        return sum(seconds for _, seconds in self.commands.values())
+
+
+current_request: ContextVar[Optional[RequestTimings]] = ContextVar("current_request", default=None)
+
+
+class MongoCommandListener(monitoring.CommandListener):
+    def __init__(self):
+        self._pending: Dict[Tuple, Tuple[str, Optional[RequestTimings]]] = {}
+
+    def started(self, event):
+        value = event.command.get(event.command_name)
+        collection = value if isinstance(value, str) else event.command.get("collection", "")
+        self._pending[event.connection_id, event.request_id] = (collection, current_request.get())
+
+    def _finish(self, event) -> Tuple[str, float]:
+        collection, timings = self._pending.pop((event.connection_id, event.request_id), ("", None))
+        seconds = event.duration_micros / 1e6
+        mongo_command_duration.observe(seconds, collection, event.command_name)
+        if timings is not None:
+            timings.add(collection, event.command_name, seconds)
+        return collection, seconds
+
+    def succeeded(self, event):
+        self._finish(event)
+
+    def failed(self, event):
+        collection, _ = self._finish(event)
+        mongo_command_failures.inc(collection, event.command_name)
+
+
+class MetricsMiddleware:
+    """ASGI middleware recording latency and in-flight requests per route."""
+
+    def __init__(self, app, routes, slow_request_ms: Optional[float] = None):
+        self.app = app
+        self.routes = routes
+        self.slow_request_ms = slow_request_ms
+
+    def _route(self, scope) -> str:
+        partial = None
+        for route in self.routes:
+            match, _ = route.matches(scope)
+            if match == Match.FULL:
+                return getattr(route, "path", "unmatched")
+            if match == Match.PARTIAL and partial is None:
+                partial = getattr(route, "path", None)
+        return partial or "unmatched"
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        method, route = scope["method"], self._route(scope)
+        status = 500
+
+        async def send_with_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        timings = RequestTimings()
+        token = current_request.set(timings)
+        http_requests_in_flight.inc(method, route)
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            elapsed = time.perf_counter() - started
+            http_requests_in_flight.dec(method, route)
+            http_request_duration.observe(elapsed, method, route, str(status))
+            current_request.reset(token)
+            if self.slow_request_ms is not None and elapsed * 1000 >= self.slow_request_ms:
+                self._log_slow(method, scope["path"], status, elapsed, timings)
+
+    def _log_slow(self, method: str, path: str, status: int, elapsed: float, timings: RequestTimings):
+        mongo = timings.mongo_seconds
+        commands = ", ".join(
+            f"{collection}.{command} x{count} {seconds * 1000:.1f} ms"
+            for (collection, command), (count, seconds) in sorted(
+                timings.commands.items(), key=lambda item: -item[1][1]
+            )
+        )
+        logger.warning(
+            "Slow request %s %s -> %s: %.1f ms total, %.1f ms MongoDB [%s], %.1f ms app",
+            method, path, status, elapsed * 1000, mongo * 1000, commands or "no commands",
+            (elapsed - mongo) * 1000
+        )
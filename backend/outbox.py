@@ -0,0 +1,278 @@
+"""Outbox of booking side effects, delivered by a pool of asyncio workers.
+
+Handlers record the notifications a reservation change calls for in the
+reservation document itself, with the same write as the change, so one
+cannot be stored without the other::
+
+    {"id": "<reservation id>", ..., "outbox": [{"event": "reservation.created", "at": <date>}]}
+
+A relay task turns those entries into one job per notification channel,
+then removes them from the reservation; confirmation emails, SMS and
+calendar syncs happen later, off the request path::
+
+    {"_id": "email:reservation.created:<reservation id>", "channel": "email",
+     "event": "reservation.created", "payload": {...}, "status": "pending",
+     "attempts": 0, "available_at": <date>}
+
+The payload is the reservation as stored when it is relayed. Job ids are
+deterministic, so relaying the same entry twice (after a crash between the
+two steps, or from two processes) stores it once. Workers claim due jobs in batches under a lease: a
+job whose worker died is claimed again once its lease expires. Failed
+deliveries are retried with exponential backoff and jitter, and marked
+``failed`` with their last error after `max_attempts`. Delivered jobs are
+kept for a week (TTL index on ``done_at``).
+
+Notifiers are objects with ``async def send(event, payload)``. `LogNotifier`
+only logs; `FakeNotifier` records what it was asked to send and can be told
+to fail, for tests and local runs.
+"""
+import asyncio
+import logging
+import random
+import uuid
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from motor.motor_asyncio import AsyncIOMotorCollection
+from pymongo import ASCENDING
+from pymongo.errors import BulkWriteError, PyMongoError
+
+from metrics import REGISTRY, Counter
+
+logger = logging.getLogger(__name__)
+
+PENDING = "pending"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+
+RESERVATION_CREATED = "reservation.created"
+RESERVATION_CANCELLED = "reservation.cancelled"
+
+# Field of the source documents listing their notifications not yet relayed
+PENDING_FIELD = "outbox"
+
+outbox_jobs = REGISTRY.register(Counter(
+    "outbox_jobs_total", "Outbox deliveries by channel, event and outcome",
+    ("channel", "event", "outcome")
+))
+
+
+def _now() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+def pending(event: str) -> dict:
+    """Entry recording `event` on a reservation, to write with the change it describes."""
+    return {"event": event, "at": _now()}
+
+
+class LogNotifier:
+    def __init__(self, channel: str):
+        self.channel = channel
+
+    async def send(self, event: str, payload: dict):
+        logger.info("%s %s for reservation %s", self.channel, event, payload.get("id"))
+
+
+class FakeNotifier:
+    """Records deliveries; fails the first `failures` of them, and waits `delay` seconds per send."""
+
+    def __init__(self, failures: int = 0, delay: float = 0.0):
+        self.failures = failures
+        self.delay = delay
+        self.sent: List[Tuple[str, dict]] = []
+        self.attempts = 0
+
+    async def send(self, event: str, payload: dict):
+        self.attempts += 1
+        if self.delay:
+            await asyncio.sleep(self.delay)
+        if self.attempts <= self.failures:
+            raise RuntimeError(f"Simulated failure {self.attempts}")
+        self.sent.append((event, payload))
+
+
+class Outbox:
+    def __init__(
+        self,
+        collection: AsyncIOMotorCollection,
+        notifiers: Dict[str, object],
+        workers: int = 4,
+        batch_size: int = 20,
+        lease_seconds: float = 60.0,
+        max_attempts: int = 8,
+        base_delay: float = 2.0,
+        max_delay: float = 600.0,
+        poll_interval: float = 1.0
+    ):
+        self.collection = collection
+        self.notifiers = notifiers
+        self.workers = workers
+        self.batch_size = batch_size
+        self.lease = timedelta(seconds=lease_seconds)
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.poll_interval = poll_interval
+        self.source: Optional[AsyncIOMotorCollection] = None
+        self.source_projection: dict = {}
+        self._wake = asyncio.Event()
+        self._pending = asyncio.Event()
+        self._stopping = False
+        self._tasks: List[asyncio.Task] = []
+
+    def relay_from(self, collection: AsyncIOMotorCollection, projection: dict):
+        """Relay the entries of `PENDING_FIELD` in `collection`, with payloads read through `projection`."""
+        self.source = collection
+        self.source_projection = projection
+
+    def notify(self):
+        """Tell the relay that entries were just written."""
+        self._pending.set()
+
+    async def enqueue(self, event: str, payloads: Iterable[dict]):
+        """Store one job per channel for each payload (keyed by its "id"); jobs already stored are skipped."""
+        now = _now()
+        jobs = [
+            {
+                "_id": f"{channel}:{event}:{payload['id']}",
+                "channel": channel,
+                "event": event,
+                "payload": payload,
+                "status": PENDING,
+                "attempts": 0,
+                "available_at": now,
+                "created_at": now,
+            }
+            for payload in payloads
+            for channel in self.notifiers
+        ]
+        if not jobs:
+            return
+        try:
+            await self.collection.insert_many(jobs, ordered=False)
+        except BulkWriteError as e:
+            # Jobs already stored by an earlier relay of the same entry are fine
+            if any(error["code"] != 11000 for error in e.details["writeErrors"]):
+                raise
+        self._wake.set()
+
+    async def relay(self) -> int:
+        """Turn the oldest pending entries of the source into jobs; returns the documents relayed."""
+        docs = await self.source.find(
+            {PENDING_FIELD: {"$exists": True}}, {**self.source_projection, PENDING_FIELD: 1}
+        ).sort(f"{PENDING_FIELD}.at", ASCENDING).to_list(self.batch_size)
+        for doc in docs:
+            entries = doc.pop(PENDING_FIELD)
+            for event in dict.fromkeys(entry["event"] for entry in entries):
+                await self.enqueue(event, [doc])
+            # Only the relayed entries go: one written meanwhile waits for the next pass
+            await self.source.update_one({"id": doc["id"]}, {"$pull": {PENDING_FIELD: {"$in": entries}}})
+            await self.source.update_one({"id": doc["id"], PENDING_FIELD: {"$size": 0}}, {"$unset": {PENDING_FIELD: ""}})
+        return len(docs)
+
+    async def claim(self, worker: str) -> List[dict]:
+        """Lease up to `batch_size` due jobs: pending ones, or running ones whose lease ran out."""
+        now = _now()
+        due = {"$or": [
+            {"status": PENDING, "available_at": {"$lte": now}},
+            {"status": RUNNING, "lease_until": {"$lte": now}},
+        ]}
+        candidates = await self.collection.find(due, {"_id": 1}).sort("available_at", ASCENDING).to_list(self.batch_size)
+        if not candidates:
+            return []
+        claim = f"{worker}:{uuid.uuid4().hex}"
+        # Jobs another worker claimed in between no longer match `due`
+        await self.collection.update_many(
+            {"_id": {"$in": [job["_id"] for job in candidates]}, **due},
+            {"$set": {"status": RUNNING, "lease_until": now + self.lease, "claim": claim}, "$inc": {"attempts": 1}}
+        )
+        return await self.collection.find({"claim": claim}).to_list(None)
+
+    def backoff(self, attempts: int) -> float:
+        delay = min(self.max_delay, self.base_delay * 2 ** (attempts - 1))
+        return delay * random.uniform(0.5, 1.0)
+
+    async def deliver(self, job: dict):
+        notifier = self.notifiers.get(job["channel"])
+        try:
+            if notifier is None:
+                raise LookupError(f"No notifier for channel {job['channel']}")
+            await notifier.send(job["event"], job["payload"])
+        except Exception as e:
+            error = f"{type(e).__name__}: {e}"
+            if job["attempts"] >= self.max_attempts:
+                update = {"status": FAILED, "error": error, "failed_at": _now()}
+                outcome = "failed"
+                logger.error("Outbox job %s failed after %d attempts: %s", job["_id"], job["attempts"], error)
+            else:
+                retry_at = _now() + timedelta(seconds=self.backoff(job["attempts"]))
+                update = {"status": PENDING, "error": error, "available_at": retry_at}
+                outcome = "retried"
+        else:
+            update = {"status": DONE, "done_at": _now()}
+            outcome = "delivered"
+        # Only the current lease holder records the outcome
+        await self.collection.update_one(
+            {"_id": job["_id"], "claim": job["claim"]},
+            {"$set": update, "$unset": {"lease_until": "", "claim": ""}}
+        )
+        outbox_jobs.inc(job["channel"], job["event"], outcome)
+
+    async def _work(self, worker: str):
+        while not self._stopping:
+            # Cleared before claiming, so a job enqueued meanwhile wakes us again
+            self._wake.clear()
+            try:
+                jobs = await self.claim(worker)
+            except PyMongoError:
+                logger.exception("Could not claim outbox jobs")
+                jobs = []
+            if not jobs:
+                try:
+                    await asyncio.wait_for(self._wake.wait(), self.poll_interval)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            for job in jobs:
+                try:
+                    await self.deliver(job)
+                except PyMongoError:
+                    # The lease expires and the job is claimed again
+                    logger.exception("Could not record the outcome of outbox job %s", job["_id"])
+
+    async def _relay(self):
+        while not self._stopping:
+            self._pending.clear()
+            try:
+                relayed = await self.relay()
+            except PyMongoError:
+                logger.exception("Could not relay pending notifications")
+                relayed = 0
+            # A full batch means more entries are waiting; otherwise wait for
+            # a write here, or poll for those of other processes
+            if relayed < self.batch_size:
+                try:
+                    await asyncio.wait_for(self._pending.wait(), self.poll_interval)
+                except asyncio.TimeoutError:
+                    pass
+
+    def start(self):
+        self._stopping = False
+        self._tasks = [asyncio.create_task(self._work(f"worker-{i}")) for i in range(self.workers)]
+        if self.source is not None:
+            self._tasks.append(asyncio.create_task(self._relay()))
+
+    async def stop(self, grace: float = 5.0):
+        """Let workers finish their current batch for up to `grace` seconds, then cancel them."""
+        if not self._tasks:
+            return
+        self._stopping = True
+        self._wake.set()
+        self._pending.set()
+        _, pending = await asyncio.wait(self._tasks, timeout=grace)
+        for task in pending:
+            task.cancel()
+        await asyncio.gather(*pending, return_exceptions=True)
+        self._tasks = []
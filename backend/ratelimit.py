@@ -0,0 +1,169 @@
+"""Admission control for the MongoDB-bound routes.
+
+- `AdmissionControl.limit(name, rate, burst)` is a dependency applying a
+  token bucket per client IP and route, kept in process. With a shared
+  collection it also counts requests in fixed windows in MongoDB, so the
+  limit holds across workers.
+- `AdmissionControl.concurrency(name, limit)` is a dependency capping how
+  many handlers of a pool talk to MongoDB at once. Reads and writes use
+  separate pools, so a write storm cannot take the capacity reads need.
+  The dependency returns the `Slot` it holds; a route streaming its response
+  calls `Slot.keep()` and releases the slot itself once the body is sent.
+
+Both shed excess requests immediately (429 or 503 with Retry-After) rather
+than queueing them. Routes without these dependencies, such as the static
+menu and info payloads, are never throttled.
+
+Clients are keyed on the address of the connection by default. Behind a
+reverse proxy that is the proxy's address, so either run uvicorn with
+``--proxy-headers --forwarded-allow-ips=<proxy address>`` (which makes the
+connection address the client's), or pass `trusted_proxies`, the number of
+proxies in front of the app: the client is then the X-Forwarded-For entry
+the outermost of them appended, counted from the right. Entries further
+left are written by the client and are never trusted.
+"""
+import math
+import time
+from datetime import datetime, timezone
+from typing import Optional
+
+from fastapi import HTTPException, Request
+from motor.motor_asyncio import AsyncIOMotorCollection
+from pymongo import ReturnDocument
+
+
+class TokenBucketLimiter:
+    """Token buckets keyed by client, holding at most `max_keys` buckets (least recently used evicted)."""
+
+    def __init__(self, rate: float, burst: int, max_keys: int = 100_000):
+        self.rate = rate
+        self.burst = burst
+        self.max_keys = max_keys
+        self._buckets = {}
+
+    def acquire(self, key: str) -> float:
+        """Take a token; returns 0 if allowed, else the seconds until one is available."""
+        now = time.monotonic()
+        tokens, last = self._buckets.pop(key, (self.burst, now))
+        tokens = min(self.burst, tokens + (now - last) * self.rate)
+        wait = 0.0
+        if tokens >= 1:
+            tokens -= 1
+        else:
+            wait = (1 - tokens) / self.rate
+        self._buckets[key] = (tokens, now)
+        if len(self._buckets) > self.max_keys:
+            del self._buckets[next(iter(self._buckets))]
+        return wait
+
+
+class SharedWindowLimiter:
+    """Fixed-window request counters in MongoDB, shared by every worker (expired by a TTL index)."""
+
+    def __init__(self, collection: AsyncIOMotorCollection, limit: int, window: float):
+        self.collection = collection
+        self.limit = limit
+        self.window = window
+
+    async def acquire(self, key: str) -> float:
+        now = time.time()
+        window = int(now // self.window)
+        ends = (window + 1) * self.window
+        doc = await self.collection.find_one_and_update(
+            {"_id": f"{key}:{window}"},
+            {"$inc": {"count": 1}, "$setOnInsert": {"expires_at": datetime.fromtimestamp(ends, timezone.utc)}},
+            upsert=True,
+            return_document=ReturnDocument.AFTER
+        )
+        return ends - now if doc["count"] > self.limit else 0.0
+
+
+async def _allow():
+    pass
+
+
+class Slot:
+    """One unit of a concurrency pool, released once."""
+
+    __slots__ = ("in_flight", "name", "held", "kept")
+
+    def __init__(self, in_flight: dict, name: str):
+        self.in_flight = in_flight
+        self.name = name
+        in_flight[name] += 1
+        self.held = True
+        self.kept = False
+
+    def keep(self) -> "Slot":
+        """Hold the slot past the handler, until `release` is called."""
+        self.kept = True
+        return self
+
+    def release(self):
+        if self.held:
+            self.held = False
+            self.in_flight[self.name] -= 1
+
+
+class AdmissionControl:
+    def __init__(
+        self,
+        enabled: bool = True,
+        shared: Optional[AsyncIOMotorCollection] = None,
+        shared_window: float = 60.0,
+        trusted_proxies: int = 0
+    ):
+        self.enabled = enabled
+        self.shared = shared
+        self.shared_window = shared_window
+        self.trusted_proxies = trusted_proxies
+        self.in_flight = {}
+
+    def client_ip(self, request: Request) -> str:
+        if self.trusted_proxies:
+            hops = [hop.strip() for hop in request.headers.get("x-forwarded-for", "").split(",") if hop.strip()]
+            if hops:
+                # With fewer hops than proxies, the leftmost one came from the outermost proxy
+                return hops[-min(self.trusted_proxies, len(hops))]
+        return request.client.host if request.client else "unknown"
+
+    def limit(self, name: str, rate: float, burst: int):
+        """Dependency allowing `rate` requests per second per client IP, with bursts of `burst`."""
+        if not self.enabled:
+            return _allow
+
+        local = TokenBucketLimiter(rate, burst)
+        shared = None
+        if self.shared is not None:
+            shared = SharedWindowLimiter(self.shared, burst + int(rate * self.shared_window), self.shared_window)
+
+        async def dependency(request: Request):
+            key = f"{name}:{self.client_ip(request)}"
+            wait = local.acquire(key)
+            if not wait and shared is not None:
+                wait = await shared.acquire(key)
+            if wait:
+                raise HTTPException(
+                    status_code=429,
+                    detail="Too many requests",
+                    headers={"Retry-After": str(math.ceil(wait))}
+                )
+
+        return dependency
+
+    def concurrency(self, name: str, limit: int):
+        """Dependency holding one of `limit` slots of pool `name` for the request's database work."""
+        self.in_flight[name] = 0
+
+        async def dependency():
+            if self.in_flight[name] >= limit:
+                raise HTTPException(status_code=503, detail="Server busy, please retry", headers={"Retry-After": "1"})
+            slot = Slot(self.in_flight, name)
+            try:
+                yield slot
+            finally:
+                # Runs before a streamed body is sent: a kept slot is released by the stream
+                if not slot.kept:
+                    slot.release()
+
+        return dependency
@@ -0,0 +1,96 @@
+"""Bookable slots compiled from a restaurant's opening hours.
+
+Opening hours are the strings shown on the site ("12:00 - 23:45",
+"Fermé", or several comma-separated ranges). `Schedule` compiles them once
+into the lunch and dinner slots of every weekday, plus exception dates
+(holidays, private events) that override the weekday, so that checking a
+date and time is a dictionary and set lookup with no database access.
+
+Exceptions are stored in the restaurant document as
+``{"exceptions": {"2026-12-25": "Fermé", "2026-12-31": "19:00 - 02:00"}}``.
+"""
+from datetime import date
+from typing import Dict, FrozenSet, List, Optional, Tuple
+
+CLOSED = "Fermé"
+WEEKDAYS = ["monday", "tuesday", "wednesday", "thursday", "friday", "saturday", "sunday"]
+
+SLOT_MINUTES = 30
+# Seatings offered per service, as (first, last) in minutes since midnight
+SERVICES = {
+    "lunch": (12 * 60, 14 * 60),
+    "dinner": (19 * 60, 21 * 60 + 30),
+}
+# Last seating must leave this long before closing
+LAST_SEATING_MARGIN = 60
+
+
+def _minutes(hhmm: str) -> int:
+    hours, minutes = hhmm.strip().split(":")
+    return int(hours) * 60 + int(minutes)
+
+
+def _label(minutes: int) -> str:
+    return f"{minutes // 60:02d}:{minutes % 60:02d}"
+
+
+def parse_hours(hours: str) -> List[Tuple[int, int]]:
+    """Opening ranges in minutes since midnight; a range past midnight ends after 24:00."""
+    if not hours or hours.strip() == CLOSED:
+        return []
+    ranges = []
+    for part in hours.split(","):
+        opens, closes = (_minutes(value) for value in part.split("-"))
+        if closes <= opens:
+            closes += 24 * 60
+        ranges.append((opens, closes))
+    return ranges
+
+
+class DaySlots:
+    __slots__ = ("lunch", "dinner", "all")
+
+    def __init__(self, hours: str):
+        ranges = parse_hours(hours)
+        services = {}
+        for service, (first, last) in SERVICES.items():
+            services[service] = tuple(
+                _label(minutes) for minutes in range(first, last + 1, SLOT_MINUTES)
+                if any(opens <= minutes <= closes - LAST_SEATING_MARGIN for opens, closes in ranges)
+            )
+        self.lunch: Tuple[str, ...] = services["lunch"]
+        self.dinner: Tuple[str, ...] = services["dinner"]
+        self.all: FrozenSet[str] = frozenset(self.lunch + self.dinner)
+
+    @property
+    def closed(self) -> bool:
+        return not self.all
+
+
+class Schedule:
+    def __init__(self, hours: Dict[str, str], exceptions: Optional[Dict[str, str]] = None):
+        self.weekdays = [DaySlots(hours.get(day, CLOSED)) for day in WEEKDAYS]
+        self.exceptions = {day: DaySlots(value) for day, value in (exceptions or {}).items()}
+
+    def day(self, day: str) -> DaySlots:
+        """Slots of an ISO date; raises ValueError for an invalid date."""
+        slots = self.exceptions.get(day)
+        if slots is None:
+            slots = self.weekdays[date.fromisoformat(day).weekday()]
+        return slots
+
+    def check(self, day: str, time: str, today: Optional[date] = None) -> Optional[str]:
+        """Why a booking at `day` `time` is not possible, or None if it is."""
+        try:
+            slots = self.day(day)
+            past = date.fromisoformat(day) < (today or date.today())
+        except ValueError:
+            return "Invalid date"
+        if past:
+            # Past days have no occupancy document left to enforce capacity on
+            return "This date is in the past"
+        if slots.closed:
+            return "The restaurant is closed on this date"
+        if time not in slots.all:
+            return "This time is not a bookable slot"
+        return None
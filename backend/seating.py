@@ -0,0 +1,205 @@
+"""Guest-weighted seating capacity.
+
+Capacity is modelled in covers (guests seated at the same time) and in
+tables per size. A party holds its tables for a whole sitting, so a 19:00
+booking still occupies the room at 20:00 and 20:30.
+
+The per-date occupancy document in db.slot_occupancy stores, for every
+half-hour mark, the covers and tables in use::
+
+    {"_id": "2026-03-14", "slots": {"19:00": {"covers": 6, "t2": 1, "t4": 1}, ...}}
+
+`DayPlan` turns that document into flat per-mark arrays and precomputes the
+free capacity of every sitting window, so each "can N guests sit at T"
+question is answered with a couple of list lookups.
+"""
+from datetime import datetime
+from functools import lru_cache
+from itertools import product
+from typing import Dict, Iterable, List, Optional, Tuple
+
+SLOT_MINUTES = 30
+SITTING_MINUTES = 120
+MARKS_PER_DAY = 24 * 60 // SLOT_MINUTES
+SITTING_MARKS = SITTING_MINUTES // SLOT_MINUTES
+
+# Maximum number of guests seated at once
+COVERS_CAPACITY = 60
+
+# Table inventory: seats per table -> number of tables
+TABLES = {2: 8, 4: 8, 6: 3, 8: 2}
+TABLE_SIZES = sorted(TABLES)
+
+MARK_LABELS = [f"{(i * SLOT_MINUTES) // 60:02d}:{(i * SLOT_MINUTES) % 60:02d}" for i in range(MARKS_PER_DAY)]
+
+
+def mark_index(time: str) -> int:
+    """Index of the half-hour mark a HH:MM time falls into."""
+    parsed = datetime.strptime(time, "%H:%M")
+    return (parsed.hour * 60 + parsed.minute) // SLOT_MINUTES
+
+
+def sitting_marks(time: str) -> List[str]:
+    """Half-hour marks occupied by a sitting starting at `time` (clamped to the day)."""
+    start = mark_index(time)
+    return MARK_LABELS[start:min(start + SITTING_MARKS, MARKS_PER_DAY)]
+
+
+@lru_cache(maxsize=None)
+def _combinations(guests: int) -> Tuple[Tuple[Tuple[int, int], ...], ...]:
+    # Every multiset of tables within the inventory that seats the party and
+    # has no superfluous table (dropping any one would leave guests standing)
+    found = []
+    for counts in product(*(range(TABLES[size] + 1) for size in TABLE_SIZES)):
+        seats = sum(size * count for size, count in zip(TABLE_SIZES, counts))
+        if seats < guests:
+            continue
+        smallest = min((size for size, count in zip(TABLE_SIZES, counts) if count), default=None)
+        if smallest is None or seats - smallest >= guests:
+            continue
+        found.append((seats - guests, sum(counts), tuple((size, count) for size, count in zip(TABLE_SIZES, counts) if count)))
+    # Fewest wasted seats first, then fewest tables pushed together
+    found.sort()
+    return tuple(tables for _, _, tables in found)
+
+
+def table_options(guests: int) -> List[Dict[int, int]]:
+    """Table assignments that can seat a party, best fit first."""
+    return [dict(tables) for tables in _combinations(guests)]
+
+
+def admission(time: str, guests: int, tables: Dict[int, int]) -> Tuple[dict, dict]:
+    """Conditions and $inc for atomically seating a party on the occupancy document.
+
+    The conditions only match if every mark of the sitting still has room for
+    the party's covers and tables after the increment.
+    """
+    conditions = {}
+    increments = {}
+    for mark in sitting_marks(time):
+        conditions[f"slots.{mark}.covers"] = {"$not": {"$gt": COVERS_CAPACITY - guests}}
+        increments[f"slots.{mark}.covers"] = guests
+        for size, count in tables.items():
+            conditions[f"slots.{mark}.t{size}"] = {"$not": {"$gt": TABLES[size] - count}}
+            increments[f"slots.{mark}.t{size}"] = count
+    return conditions, increments
+
+
+def release(time: str, guests: int, tables: Dict[int, int]) -> dict:
+    """$inc that gives a party's covers and tables back."""
+    increments = {}
+    for mark in sitting_marks(time):
+        increments[f"slots.{mark}.covers"] = -guests
+        for size, count in tables.items():
+            increments[f"slots.{mark}.t{size}"] = -count
+    return increments
+
+
+def occupancy_slots(reservations: Iterable[dict]) -> Dict[str, Dict[str, int]]:
+    """Build the `slots` field of an occupancy document from reservation documents."""
+    slots: Dict[str, Dict[str, int]] = {}
+    for res in reservations:
+        tables = stored_tables(res)
+        for mark in sitting_marks(res["time"]):
+            usage = slots.setdefault(mark, {})
+            usage["covers"] = usage.get("covers", 0) + res["guests"]
+            for size, count in tables.items():
+                usage[f"t{size}"] = usage.get(f"t{size}", 0) + count
+    return slots
+
+
+def stored_tables(reservation: dict) -> Dict[int, int]:
+    """Tables held by a stored reservation (`tables` field, keyed by size as a string)."""
+    tables = reservation.get("tables")
+    if tables:
+        return {int(size): count for size, count in tables.items()}
+    return table_options(reservation["guests"])[0]
+
+
+def _usage(occupancy: Optional[dict]) -> Tuple[List[int], Dict[int, List[int]]]:
+    """Covers and tables in use at every mark of the day, as flat arrays."""
+    covers = [0] * MARKS_PER_DAY
+    tables = {size: [0] * MARKS_PER_DAY for size in TABLE_SIZES}
+    for mark, usage in (occupancy or {}).get("slots", {}).items():
+        i = mark_index(mark)
+        covers[i] = usage.get("covers", 0)
+        for size in TABLE_SIZES:
+            tables[size][i] = usage.get(f"t{size}", 0)
+    return covers, tables
+
+
+class DayPlan:
+    """Free capacity of one day, per sitting start mark."""
+
+    __slots__ = ("free_covers", "free_tables")
+
+    def __init__(self, occupancy: Optional[dict] = None):
+        covers, tables = _usage(occupancy)
+
+        # Free capacity of a sitting starting at mark i is limited by its busiest mark
+        self.free_covers = [COVERS_CAPACITY - max(covers[i:i + SITTING_MARKS]) for i in range(MARKS_PER_DAY)]
+        self.free_tables = {
+            size: [TABLES[size] - max(used[i:i + SITTING_MARKS]) for i in range(MARKS_PER_DAY)]
+            for size, used in tables.items()
+        }
+
+    def options(self, guests: int, time: str) -> List[Dict[int, int]]:
+        """Table assignments that are free for the whole sitting, best fit first."""
+        i = mark_index(time)
+        if self.free_covers[i] < guests:
+            return []
+        return [
+            tables for tables in table_options(guests)
+            if all(self.free_tables[size][i] >= count for size, count in tables.items())
+        ]
+
+    def can_seat(self, guests: int, time: str) -> bool:
+        return bool(self.options(guests, time))
+
+    def available(self, guests: int, times: Iterable[str]) -> List[str]:
+        return [t for t in times if self.can_seat(guests, t)]
+
+
+class DayLedger:
+    """Mutable usage of one day for seating a batch of parties in memory.
+
+    Parties are seated one after the other against the day's occupancy, and
+    the accumulated increments are then written with a single conditional
+    update (see `admission`).
+    """
+
+    def __init__(self, occupancy: Optional[dict] = None):
+        self.covers, self.tables = _usage(occupancy)
+        self.increments: Dict[Tuple[int, str], int] = {}
+
+    def seat(self, guests: int, time: str) -> Optional[Dict[int, int]]:
+        start = mark_index(time)
+        window = range(start, min(start + SITTING_MARKS, MARKS_PER_DAY))
+        if any(self.covers[i] + guests > COVERS_CAPACITY for i in window):
+            return None
+        for tables in table_options(guests):
+            if all(self.tables[size][i] + count <= TABLES[size] for size, count in tables.items() for i in window):
+                for i in window:
+                    self.covers[i] += guests
+                    self.increments[i, "covers"] = self.increments.get((i, "covers"), 0) + guests
+                    for size, count in tables.items():
+                        self.tables[size][i] += count
+                        self.increments[i, f"t{size}"] = self.increments.get((i, f"t{size}"), 0) + count
+                return tables
+        return None
+
+    def admission(self) -> Tuple[dict, dict]:
+        """Conditions and $inc for writing every party seated so far at once.
+
+        The conditions only require room for the batch on top of the current
+        usage, so the update still succeeds if concurrent bookings took
+        capacity the batch did not need.
+        """
+        conditions = {}
+        increments = {}
+        for (i, field), delta in self.increments.items():
+            path = f"slots.{MARK_LABELS[i]}.{field}"
+            capacity = COVERS_CAPACITY if field == "covers" else TABLES[int(field[1:])]
+            conditions[path] = {"$not": {"$gt": capacity - delta}}
+            increments[path] = delta
+        return conditions, increments
@@ -1,25 +1,169 @@
-from fastapi import FastAPI, APIRouter, HTTPException
+from fastapi import FastAPI, APIRouter, Depends, Header, HTTPException, Query, Request
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import PlainTextResponse, StreamingResponse
 from dotenv import load_dotenv
 from starlette.middleware.cors import CORSMiddleware
 from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo.errors import BulkWriteError, DuplicateKeyError, PyMongoError
+from starlette.background import BackgroundTask
 import os
+import asyncio
+import json
+import base64
+import heapq
 import logging
+import tempfile
 from pathlib import Path
-from pydantic import BaseModel, Field, ConfigDict
-from typing import List, Optional
+from pydantic import BaseModel, Field, ConfigDict, ValidationError, field_validator
+from typing import Dict, List, Optional
 import uuid
-from datetime import datetime, timezone, date, time
+from contextlib import asynccontextmanager
+from datetime import datetime, timezone, date, time, timedelta
+from time import perf_counter
+
+import fastjson
+import seating
+from analytics import CANCELLED, CONFIRMED, NO_SHOW, Rollups, summarise
+from archive import Archiver
+from bulk_import import iter_rows
+from content import ContentSnapshot, ContentStore
+from fastjson import TrustedJSONResponse
+import guest_lookup
+from idempotency import IdempotencyStore
+from indexes import ensure_indexes
+from live import AvailabilityBroadcaster, SubscriberLimit
+from menu_search import MenuIndex
+from metrics import REGISTRY, Gauge, MetricsMiddleware, MongoCommandListener
+from outbox import PENDING_FIELD, RESERVATION_CANCELLED, RESERVATION_CREATED, LogNotifier, Outbox, pending
+from ratelimit import AdmissionControl, Slot
+from schedule import DaySlots, Schedule
+from seating import DayLedger, DayPlan
+from write_buffer import BufferFull, WriteBuffer
 
 ROOT_DIR = Path(__file__).parent
 load_dotenv(ROOT_DIR / '.env')
 
-# MongoDB connection
+# MongoDB connection. connect=False keeps the import free of network I/O;
+# the pool is opened and checked on startup (see warm_up_connections).
 mongo_url = os.environ['MONGO_URL']
-client = AsyncIOMotorClient(mongo_url)
+mongo_min_pool_size = int(os.environ.get('MONGO_MIN_POOL_SIZE', '10'))
+client = AsyncIOMotorClient(
+    mongo_url,
+    maxPoolSize=int(os.environ.get('MONGO_MAX_POOL_SIZE', '100')),
+    minPoolSize=mongo_min_pool_size,
+    maxIdleTimeMS=int(os.environ.get('MONGO_MAX_IDLE_TIME_MS', '300000')),
+    serverSelectionTimeoutMS=int(os.environ.get('MONGO_SERVER_SELECTION_TIMEOUT_MS', '5000')),
+    connectTimeoutMS=int(os.environ.get('MONGO_CONNECT_TIMEOUT_MS', '5000')),
+    socketTimeoutMS=int(os.environ.get('MONGO_SOCKET_TIMEOUT_MS', '30000')),
+    connect=False,
+    event_listeners=[MongoCommandListener()]
+)
 db = client[os.environ['DB_NAME']]
 
+# Responses of POSTs sent with an Idempotency-Key
+idempotency = IdempotencyStore(db.idempotency_keys)
+
+# Optional coalescing of contact message writes (CONTACT_WRITE_BUFFER=1),
+# created on startup
+contact_buffer: Optional[WriteBuffer] = None
+
+# Per-client rate limits and concurrency caps on the MongoDB-bound routes
+# (see ratelimit.py). RATE_LIMIT_BACKEND=mongo shares the limits across
+# workers; RATE_LIMITS=off disables the per-client limits.
+admission = AdmissionControl(
+    enabled=os.environ.get('RATE_LIMITS') != 'off',
+    shared=db.rate_limits if os.environ.get('RATE_LIMIT_BACKEND') == 'mongo' else None,
+    # Number of reverse proxies appending to X-Forwarded-For; 0 keys clients
+    # on the connection address (right with uvicorn --proxy-headers)
+    trusted_proxies=int(os.environ.get('TRUSTED_PROXIES', '0'))
+)
+read_slot = Depends(admission.concurrency("reads", int(os.environ.get('MAX_DB_READS', '64'))))
+write_slot = Depends(admission.concurrency("writes", int(os.environ.get('MAX_DB_WRITES', '32'))))
+
+# Per-day and per-slot counters for the analytics endpoint (see analytics.py)
+rollups = Rollups(db.daily_rollups)
+
+# Moves reservations older than ARCHIVE_AFTER_DAYS to db.reservations_archive
+# (see archive.py); 0 disables archival
+archiver = Archiver(
+    db,
+    horizon_days=int(os.environ.get('ARCHIVE_AFTER_DAYS', '180')),
+    batch_size=int(os.environ.get('ARCHIVE_BATCH_SIZE', '500')),
+    interval=float(os.environ.get('ARCHIVE_INTERVAL_SECONDS', '3600'))
+)
+
+# Menu, reviews and info of every restaurant, served from an in-memory
+# snapshot that a background task keeps in step with db.restaurants
+content = ContentStore(db.restaurants, refresh_interval=float(os.environ.get('CONTENT_REFRESH_SECONDS', '5')))
+# Restaurant served by the routes without a slug
+DEFAULT_RESTAURANT = os.environ.get('DEFAULT_RESTAURANT', 'le-gros-arbre')
+
+# Menu search index per restaurant, updated incrementally on every content swap
+menu_indexes: Dict[str, MenuIndex] = {}
+
+def update_menu_indexes(old: ContentSnapshot, new: ContentSnapshot):
+    # Updated on copies: the served indexes change only once the swap happens
+    updated = {}
+    for slug, restaurant in new.restaurants.items():
+        previous = old.restaurants.get(slug)
+        if previous is None or previous.version != restaurant.version:
+            index = menu_indexes[slug].copy() if slug in menu_indexes else MenuIndex()
+            index.update(restaurant.menu)
+            updated[slug] = index
+
+    def install():
+        menu_indexes.update(updated)
+        for slug in set(menu_indexes) - set(new.restaurants):
+            del menu_indexes[slug]
+
+    return install
+
+content.on_swap(update_menu_indexes)
+
+# Opening hours compiled into bookable slots per restaurant (see schedule.py)
+schedules: Dict[str, Schedule] = {}
+
+def compile_schedules(old: ContentSnapshot, new: ContentSnapshot):
+    # Invalid hours raise ValueError here, and the content is not swapped in
+    compiled = {
+        slug: Schedule(restaurant.info.get("hours", {}), restaurant.exceptions)
+        for slug, restaurant in new.restaurants.items()
+        if slug not in old.restaurants or old.restaurants[slug].version != restaurant.version
+    }
+
+    def install():
+        schedules.update(compiled)
+        for slug in set(schedules) - set(new.restaurants):
+            del schedules[slug]
+        # Opening hours may have changed: resend the slots of watched dates
+        live.notify_all()
+
+    return install
+
+content.on_swap(compile_schedules)
+
+def restaurant_schedule() -> Schedule:
+    # Missing only while no valid content could be loaded yet
+    if DEFAULT_RESTAURANT not in schedules:
+        raise HTTPException(status_code=503, detail="Opening hours unavailable", headers={"Retry-After": "5"})
+    return schedules[DEFAULT_RESTAURANT]
+
+def check_bookable(day: str, time: str):
+    """Reject a closed day or an unscheduled time before any database work."""
+    reason = restaurant_schedule().check(day, time)
+    if reason is not None:
+        raise HTTPException(status_code=422, detail=reason)
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    await startup()
+    try:
+        yield
+    finally:
+        await shutdown_db_client()
+
 # Create the main app
-app = FastAPI()
+app = FastAPI(lifespan=lifespan)
 
 # Create a router with the /api prefix
 api_router = APIRouter(prefix="/api")
@@ -29,11 +173,19 @@ class ReservationCreate(BaseModel):
     name: str
     email: str
     phone: str
-    date: str  # ISO format date string
-    time: str  # HH:MM format
+    # date and time are used as keys in the slot occupancy index, so they are
+    # constrained to their canonical formats
+    date: str = Field(pattern=r"^\d{4}-\d{2}-\d{2}$")  # ISO format date string
+    time: str = Field(pattern=r"^\d{2}:\d{2}$")  # HH:MM format
     guests: int = Field(ge=1, le=20)
     special_requests: Optional[str] = None
 
+    @field_validator("time")
+    @classmethod
+    def check_time(cls, v: str) -> str:
+        datetime.strptime(v, "%H:%M")
+        return v
+
 class Reservation(BaseModel):
     model_config = ConfigDict(extra="ignore")
     id: str = Field(default_factory=lambda: str(uuid.uuid4()))
@@ -47,6 +199,9 @@ class Reservation(BaseModel):
     status: str = "confirmed"
     created_at: str = Field(default_factory=lambda: datetime.now(timezone.utc).isoformat())
 
+# Only the Reservation fields, so stored documents can be returned without re-validation
+RESERVATION_PROJECTION = {"_id": 0, **{field: 1 for field in Reservation.model_fields}}
+
 class ContactMessage(BaseModel):
     model_config = ConfigDict(extra="ignore")
     id: str = Field(default_factory=lambda: str(uuid.uuid4()))
@@ -60,183 +215,727 @@ class ContactMessageCreate(BaseModel):
     email: str
     message: str
 
-# Menu data
-MENU_DATA = {
-    "entrees": [
-        {"name": "Velouté de butternut", "description": "Crème fraîche, graines de courge torréfiées, huile de noisette", "price": 12},
-        {"name": "Burrata crémeuse", "description": "Tomates anciennes, pesto de basilic frais, huile d'olive extra vierge", "price": 14},
-        {"name": "Tartare de saumon", "description": "Avocat, agrumes, herbes fraîches, toast de pain au levain", "price": 16},
-        {"name": "Œuf parfait 63°", "description": "Crème de champignons, lardons croustillants, mouillettes au beurre", "price": 13},
-    ],
-    "plats": [
-        {"name": "Filet de bœuf Rossini", "description": "Escalope de foie gras poêlée, sauce Périgueux, pommes grenaille", "price": 38},
-        {"name": "Suprême de volaille fermière", "description": "Jus au thym, écrasé de pommes de terre à l'huile de truffe", "price": 28},
-        {"name": "Pavé de cabillaud rôti", "description": "Beurre blanc au citron, légumes de saison, riz sauvage", "price": 32},
-        {"name": "Risotto aux cèpes", "description": "Parmesan 24 mois, huile de truffe noire, roquette", "price": 26},
-    ],
-    "desserts": [
-        {"name": "Fondant au chocolat Valrhona", "description": "Cœur coulant, crème anglaise vanille bourbon", "price": 12},
-        {"name": "Tarte Tatin", "description": "Pommes caramélisées, glace vanille de Madagascar, caramel beurre salé", "price": 11},
-        {"name": "Crème brûlée à la lavande", "description": "Caramel craquant, tuile aux amandes", "price": 10},
-        {"name": "Assiette de fromages affinés", "description": "Sélection du moment, confiture de figues, noix", "price": 14},
-    ],
-    "boissons": [
-        {"name": "Verre de vin rouge (Bordeaux)", "description": "Château sélection du sommelier", "price": 8},
-        {"name": "Verre de vin blanc (Loire)", "description": "Sancerre, notes d'agrumes", "price": 9},
-        {"name": "Cocktail signature Le Gros Arbre", "description": "Gin, sirop de sureau, citron vert, menthe fraîche", "price": 12},
-        {"name": "Café gourmand", "description": "Espresso accompagné de trois mignardises maison", "price": 9},
-    ]
-}
+# Booking confirmations and calendar syncs, recorded in the reservation
+# documents and delivered after the response by OUTBOX_WORKERS background
+# workers (see outbox.py). Channels only log until real notifiers are configured.
+outbox = Outbox(
+    db.outbox,
+    {channel: LogNotifier(channel) for channel in os.environ.get('OUTBOX_CHANNELS', 'email,sms,calendar').split(',') if channel},
+    workers=int(os.environ.get('OUTBOX_WORKERS', '4'))
+)
+# Payloads are the reservations as the API returns them
+outbox.relay_from(db.reservations, RESERVATION_PROJECTION)
 
-# Reviews data
-REVIEWS_DATA = [
-    {
-        "id": "1",
-        "author": "Noémie Asfaux",
-        "badge": "Local Guide · 24 avis · 48 photos",
-        "text": "Un cadre magnifique, une cuisine faite maison. Je recommande.",
-        "rating": 5
-    },
-    {
-        "id": "2", 
-        "author": "Antoine S",
-        "badge": "Local Guide · 696 avis · 2 771 photos",
-        "text": "Un lieu hors du temps ! Un bout de campagne avec une maison isolée et un cèdre du Liban bicentenaire se mirant dans les eaux du Bassin des Filtres, un ouvrage historique du Canal du Midi",
-        "rating": 5
-    },
-    {
-        "id": "3",
-        "author": "Marie L.",
-        "badge": "25 avis",
-        "text": "Excellente découverte ! L'ambiance est chaleureuse et les plats sont délicieux. Le service est impeccable.",
-        "rating": 5
-    },
-    {
-        "id": "4",
-        "author": "Pierre D.",
-        "badge": "Local Guide · 150 avis",
-        "text": "Un endroit magique au bord de l'eau. La terrasse sous le cèdre est un vrai bonheur. Cuisine raffinée et généreuse.",
-        "rating": 4
-    }
-]
-
-# Restaurant info
-RESTAURANT_INFO = {
-    "name": "Le Gros Arbre",
-    "address": "110 Rue des Amidonniers, 31000 Toulouse",
-    "area": "Bassin des Filtres – Centre-ville",
-    "phone": "07 65 87 29 34",
-    "facebook": "facebook.com",
-    "rating": 4.4,
-    "reviews_count": 558,
-    "price_range": "30-40€",
-    "hours": {
-        "monday": "12:00 - 23:30",
-        "tuesday": "Fermé",
-        "wednesday": "Fermé",
-        "thursday": "12:00 - 23:45",
-        "friday": "12:00 - 23:45",
-        "saturday": "12:00 - 23:45",
-        "sunday": "12:00 - 23:45"
-    },
-    "coordinates": {
-        "lat": 43.6114,
-        "lng": 1.4289
+# Longest range served by /api/availability
+MAX_AVAILABILITY_DAYS = 62
+
+def available_slots(plan: DayPlan, guests: int, slots: DaySlots) -> dict:
+    return {
+        "lunch": plan.available(guests, slots.lunch),
+        "dinner": plan.available(guests, slots.dinner)
     }
-}
+
+async def load_live_slots(date: str, guests: List[int]) -> Dict[int, dict]:
+    """Slots of `date` for each party size, as pushed by the live availability stream."""
+    slots = restaurant_schedule().day(date)
+    if slots.closed:
+        return {size: {"lunch": [], "dinner": []} for size in guests}
+    plan = DayPlan(await db.slot_occupancy.find_one({"_id": date}))
+    return {size: available_slots(plan, size, slots) for size in guests}
+
+# Subscribers to live availability (see live.py). LIVE_CHANGE_STREAM=1 also
+# pushes bookings taken by other workers, through a MongoDB change stream.
+live = AvailabilityBroadcaster(
+    load_live_slots,
+    max_subscribers=int(os.environ.get('LIVE_MAX_SUBSCRIBERS', '10000'))
+)
+
+def reservation_document(reservation: Reservation, tables: Dict[int, int], notify: bool = True) -> dict:
+    doc = reservation.model_dump()
+    # Remember which tables were taken so cancellation gives back exactly those
+    doc["tables"] = {str(size): count for size, count in tables.items()}
+    # Normalised guest details for /api/reservations/search (see guest_lookup.py)
+    doc.update(guest_lookup.lookup_fields(reservation.name, reservation.email, reservation.phone))
+    # Confirmation notifications, stored with the booking (see outbox.py)
+    if notify:
+        doc[PENDING_FIELD] = [pending(RESERVATION_CREATED)]
+    return doc
+
+# Slot occupancy index
+# One document per date in db.slot_occupancy holding the covers and tables in
+# use at every half-hour mark (see seating.py). It is kept in step by
+# create_reservation / cancel_reservation so that availability is a single
+# primary-key read instead of a scan of the bookings.
+
+# Conditional updates a booking makes at most before it is refused
+SEAT_ATTEMPTS = 3
+
+async def seat_party(date: str, time: str, guests: int) -> Optional[Dict[int, int]]:
+    """Atomically take covers and tables for a sitting, or return None if it does not fit.
+
+    Each attempt is a single conditional update on the day's occupancy
+    document, so capacity holds across concurrent requests and across
+    workers. The best fit is tried straight away, without a read. Only when
+    it is taken is the day read, and the best assignment still free tried,
+    up to SEAT_ATTEMPTS updates in all; a day with no room left answers
+    after one update and one read.
+    """
+    best = seating.table_options(guests)[0]
+    if await apply_occupancy(date, *seating.admission(time, guests, best)):
+        return best
+    for _ in range(SEAT_ATTEMPTS - 1):
+        options = DayPlan(await db.slot_occupancy.find_one({"_id": date})).options(guests, time)
+        if not options:
+            return None
+        # Lost to a concurrent booking if this fails: read again
+        if await apply_occupancy(date, *seating.admission(time, guests, options[0])):
+            return options[0]
+    return None
+
+async def apply_occupancy(date: str, conditions: dict, increments: dict) -> bool:
+    """Apply $inc to the day's occupancy document if `conditions` hold, in one update."""
+    query = {"_id": date, **conditions}
+    update = {"$inc": increments}
+    try:
+        await db.slot_occupancy.update_one(query, update, upsert=True)
+        return True
+    except DuplicateKeyError:
+        # The day's document already exists but did not match: either the
+        # capacity was just taken, or a concurrent first booking of the day
+        # created it. Retry without upsert to tell the two apart.
+        result = await db.slot_occupancy.update_one(query, update)
+        return result.modified_count == 1
+
+async def release_party(date: str, time: str, guests: int, tables: Dict[int, int]):
+    await db.slot_occupancy.update_one(
+        {"_id": date},
+        {"$inc": seating.release(time, guests, tables)}
+    )
+
+async def _write_day_occupancy(date: str, reservations: List[dict], keep_existing: bool):
+    slots = seating.occupancy_slots(reservations)
+    if keep_existing:
+        await db.slot_occupancy.update_one({"_id": date}, {"$setOnInsert": {"slots": slots}}, upsert=True)
+    else:
+        await db.slot_occupancy.replace_one({"_id": date}, {"slots": slots}, upsert=True)
+
+async def rebuild_slot_occupancy(keep_existing: bool = True):
+    """Rebuild the occupancy index from db.reservations in one pass, a day at a time.
+
+    With keep_existing, dates that already have an occupancy document are left
+    untouched, which makes it safe to run while bookings are being taken.
+    """
+    cursor = db.reservations.find(
+        {"status": {"$ne": CANCELLED}}, {"_id": 0, "date": 1, "time": 1, "guests": 1, "tables": 1}
+    ).sort("date", 1)
+    day, reservations = None, []
+    async for res in cursor:
+        if res["date"] != day:
+            if reservations:
+                await _write_day_occupancy(day, reservations, keep_existing)
+            day, reservations = res["date"], []
+        reservations.append(res)
+    if reservations:
+        await _write_day_occupancy(day, reservations, keep_existing)
 
 # API Routes
 @api_router.get("/")
 async def root():
     return {"message": "Le Gros Arbre API"}
 
+def content_unavailable(slug: str):
+    # Nothing loaded yet (see load_content): the default restaurant exists, come back later
+    if slug == DEFAULT_RESTAURANT and not content.snapshot.restaurants:
+        raise HTTPException(status_code=503, detail="Restaurant content unavailable", headers={"Retry-After": "5"})
+    raise HTTPException(status_code=404, detail="Restaurant not found")
+
+def restaurant_content(slug: str):
+    restaurant = content.restaurant(slug)
+    if restaurant is None:
+        content_unavailable(slug)
+    return restaurant
+
 @api_router.get("/menu")
-async def get_menu():
-    return MENU_DATA
+async def get_menu(request: Request):
+    return restaurant_content(DEFAULT_RESTAURANT).payloads["menu"].response(request)
+
+def search_menu(slug: str, q: str, category: Optional[str], min_price: Optional[float], max_price: Optional[float]):
+    if slug not in menu_indexes:
+        content_unavailable(slug)
+    results = menu_indexes[slug].search(q, category=category, min_price=min_price, max_price=max_price)
+    return {"count": len(results), "results": results}
+
+@api_router.get("/menu/search")
+async def get_menu_search(
+    q: str = "",
+    category: Optional[str] = None,
+    min_price: Optional[float] = Query(None, ge=0),
+    max_price: Optional[float] = Query(None, ge=0)
+):
+    return search_menu(DEFAULT_RESTAURANT, q, category, min_price, max_price)
 
 @api_router.get("/reviews")
-async def get_reviews():
-    return REVIEWS_DATA
+async def get_reviews(request: Request):
+    return restaurant_content(DEFAULT_RESTAURANT).payloads["reviews"].response(request)
 
 @api_router.get("/info")
-async def get_restaurant_info():
-    return RESTAURANT_INFO
-
-@api_router.post("/reservations", response_model=Reservation)
-async def create_reservation(input: ReservationCreate):
-    reservation = Reservation(
-        name=input.name,
-        email=input.email,
-        phone=input.phone,
-        date=input.date,
-        time=input.time,
-        guests=input.guests,
-        special_requests=input.special_requests
-    )
+async def get_restaurant_info(request: Request):
+    return restaurant_content(DEFAULT_RESTAURANT).payloads["info"].response(request)
+
+@api_router.get("/restaurants/{slug}/menu")
+async def get_restaurant_menu(slug: str, request: Request):
+    return restaurant_content(slug).payloads["menu"].response(request)
+
+@api_router.get("/restaurants/{slug}/menu/search")
+async def get_restaurant_menu_search(
+    slug: str,
+    q: str = "",
+    category: Optional[str] = None,
+    min_price: Optional[float] = Query(None, ge=0),
+    max_price: Optional[float] = Query(None, ge=0)
+):
+    return search_menu(slug, q, category, min_price, max_price)
+
+@api_router.get("/restaurants/{slug}/reviews")
+async def get_restaurant_reviews(slug: str, request: Request):
+    return restaurant_content(slug).payloads["reviews"].response(request)
+
+@api_router.get("/restaurants/{slug}/info")
+async def get_restaurant_info_by_slug(slug: str, request: Request):
+    return restaurant_content(slug).payloads["info"].response(request)
+
+@api_router.post(
+    "/reservations",
+    response_model=Reservation,
+    responses={409: {"description": "Time slot is fully booked"}},
+    dependencies=[Depends(admission.limit("reservations", rate=0.2, burst=10)), write_slot]
+)
+async def create_reservation(
+    input: ReservationCreate,
+    idempotency_key: Optional[str] = Header(None, alias="Idempotency-Key")
+):
+    check_bookable(input.date, input.time)
     
-    doc = reservation.model_dump()
-    await db.reservations.insert_one(doc)
+    async def book():
+        tables = await seat_party(input.date, input.time, input.guests)
+        if tables is None:
+            raise HTTPException(status_code=409, detail="This time slot is fully booked")
+        
+        reservation = Reservation(
+            name=input.name,
+            email=input.email,
+            phone=input.phone,
+            date=input.date,
+            time=input.time,
+            guests=input.guests,
+            special_requests=input.special_requests
+        )
+        
+        doc = reservation_document(reservation, tables)
+        try:
+            await db.reservations.insert_one(doc)
+        except Exception:
+            # After a timeout the insert may still have been applied: give the
+            # claimed capacity back only once the booking is known to be gone
+            try:
+                await db.reservations.delete_one({"id": reservation.id})
+            except PyMongoError:
+                logger.exception("Could not remove reservation %s after a failed insert", reservation.id)
+            else:
+                await release_party(reservation.date, reservation.time, reservation.guests, tables)
+            raise
+        
+        outbox.notify()
+        await rollups.booked([(reservation.date, reservation.time, reservation.guests)])
+        live.notify(reservation.date)
+        return reservation
+    
+    # A retried request with the same Idempotency-Key gets the original booking back
+    return await idempotency.run("reservations", idempotency_key, input, book)
+
+# Rows validated, seated and inserted together by the bulk import
+BULK_BATCH_SIZE = 500
+
+async def import_batch(rows: List[tuple], notify: bool = False) -> Dict[int, dict]:
+    """Validate, seat and insert one batch of bulk rows; returns a result per row number.
+
+    Confirmations are only queued for the created rows when `notify` is set.
+    """
+    results = {}
+    by_date: Dict[str, List[tuple]] = {}
+    for row, item in rows:
+        try:
+            input = ReservationCreate.model_validate(item)
+        except ValidationError as e:
+            results[row] = {"status": "invalid", "errors": e.errors(include_url=False, include_context=False)}
+            continue
+        reason = restaurant_schedule().check(input.date, input.time)
+        if reason is not None:
+            results[row] = {"status": "invalid", "errors": reason}
+            continue
+        by_date.setdefault(input.date, []).append((row, input))
+    
+    # Seat the batch against each day's occupancy in memory, then write each
+    # day's capacity in one conditional update
+    occupancy = {
+        doc["_id"]: doc
+        async for doc in db.slot_occupancy.find({"_id": {"$in": list(by_date)}})
+    }
+    seated = []
+    for day, items in by_date.items():
+        ledger = DayLedger(occupancy.get(day))
+        admitted = []
+        for row, input in items:
+            tables = ledger.seat(input.guests, input.time)
+            if tables is None:
+                results[row] = {"status": "full"}
+            else:
+                admitted.append((row, input, tables))
+        if not admitted:
+            continue
+        if await apply_occupancy(day, *ledger.admission()):
+            seated.extend(admitted)
+            continue
+        # Concurrent bookings took the room the batch needed: seat row by row
+        for row, input, _ in admitted:
+            tables = await seat_party(day, input.time, input.guests)
+            if tables is None:
+                results[row] = {"status": "full"}
+            else:
+                seated.append((row, input, tables))
+    
+    if not seated:
+        return results
+    reservations = [(row, Reservation(**input.model_dump()), tables) for row, input, tables in seated]
+    failed, unknown = set(), set()
+    try:
+        await db.reservations.insert_many(
+            [reservation_document(reservation, tables, notify) for _, reservation, tables in reservations],
+            ordered=False
+        )
+    except BulkWriteError as e:
+        failed = {error["index"] for error in e.details["writeErrors"]}
+    except PyMongoError:
+        # Timeout or lost connection: the outcome of each insert is unknown, so
+        # remove whatever was stored before giving the capacity back
+        logger.exception("Bulk import batch insert failed")
+        try:
+            await db.reservations.delete_many({"id": {"$in": [reservation.id for _, reservation, _ in reservations]}})
+            failed = set(range(len(reservations)))
+        except PyMongoError:
+            # Some rows may be stored: keep their capacity, and let the client
+            # check them by id before importing them again
+            logger.exception("Could not remove the partially inserted batch")
+            unknown = set(range(len(reservations)))
+    for i, (row, reservation, tables) in enumerate(reservations):
+        if i in failed:
+            try:
+                await release_party(reservation.date, reservation.time, reservation.guests, tables)
+            except PyMongoError:
+                logger.exception("Could not release the capacity of bulk row %d", row)
+            results[row] = {"status": "failed"}
+        elif i in unknown:
+            results[row] = {"status": "unknown", "id": reservation.id}
+        else:
+            results[row] = {"status": "created", "id": reservation.id}
+    created = [reservation for i, (_, reservation, _) in enumerate(reservations) if i not in failed | unknown]
+    if created and notify:
+        outbox.notify()
+    await rollups.booked((reservation.date, reservation.time, reservation.guests) for reservation in created)
+    for day in {reservation.date for _, reservation, _ in reservations}:
+        live.notify(day)
+    return results
+
+@api_router.post("/reservations/bulk", dependencies=[Depends(admission.limit("bulk", rate=1 / 60, burst=2)), write_slot])
+async def import_reservations(request: Request, notify: bool = Query(False)):
+    """Import reservations from a JSON array or an NDJSON body (Content-Type: application/x-ndjson).
+
+    Rows are parsed as they arrive and processed in batches, so the body is
+    never held in memory. The response is NDJSON with one result per row:
+    created (with its id), invalid (with validation errors), full, failed, or
+    unknown (with its id: the database could not tell whether the row was
+    stored, so check it before importing it again). Results are spooled to
+    disk past 1 MB.
+
+    Imported bookings are usually already confirmed to their guests, so the
+    confirmation notifications are only sent with ?notify=1.
+    """
+    ndjson = "ndjson" in request.headers.get("content-type", "")
+    out = tempfile.SpooledTemporaryFile(max_size=1 << 20)
+    counts: Dict[str, int] = {}
     
-    return reservation
+    def write(results: Dict[int, dict]):
+        for row in sorted(results):
+            result = {"row": row, **results[row]}
+            counts[result["status"]] = counts.get(result["status"], 0) + 1
+            out.write(json.dumps(result, default=str).encode() + b"\n")
+    
+    batch, row = [], 0
+    try:
+        async for item in iter_rows(request.stream(), ndjson):
+            batch.append((row, item))
+            row += 1
+            if len(batch) == BULK_BATCH_SIZE:
+                write(await import_batch(batch, notify))
+                batch = []
+    except ValueError as e:
+        # Malformed body: keep the rows read so far and report where it stopped
+        if batch:
+            write(await import_batch(batch, notify))
+            batch = []
+        write({row: {"status": "invalid", "errors": f"Malformed body: {e}"}})
+    if batch:
+        write(await import_batch(batch, notify))
+    
+    out.seek(0)
+    return StreamingResponse(
+        iter(lambda: out.read(1 << 16), b""),
+        media_type="application/x-ndjson",
+        headers={f"X-Import-{status.capitalize()}": str(n) for status, n in counts.items()},
+        background=BackgroundTask(out.close)
+    )
+
+# Listing page size
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 1000
+
+def encode_cursor(doc: dict) -> str:
+    raw = json.dumps([doc["created_at"], doc["id"]]).encode()
+    return base64.urlsafe_b64encode(raw).decode()
+
+def decode_cursor(cursor: str) -> dict:
+    """Keyset condition for the reservations listed after `cursor`."""
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+    except (ValueError, TypeError):
+        raise HTTPException(status_code=422, detail="Invalid cursor")
+    # Only the strings encode_cursor writes, never operators or other types
+    if not (isinstance(values, list) and len(values) == 2 and all(isinstance(value, str) for value in values)):
+        raise HTTPException(status_code=422, detail="Invalid cursor")
+    created_at, reservation_id = values
+    return {"$or": [
+        {"created_at": {"$gt": created_at}},
+        {"created_at": created_at, "id": {"$gt": reservation_id}}
+    ]}
+
+async def stream_ndjson(cursor, slot: Slot):
+    try:
+        async for doc in cursor:
+            yield fastjson.dumps(doc) + b"\n"
+    finally:
+        slot.release()
 
 @api_router.get("/reservations", response_model=List[Reservation])
-async def get_reservations():
-    reservations = await db.reservations.find({}, {"_id": 0}).to_list(1000)
-    return reservations
+async def get_reservations(
+    slot: Slot = read_slot,
+    date: Optional[str] = None,
+    status: Optional[str] = None,
+    cursor: Optional[str] = None,
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    format: str = Query("json", pattern="^(json|ndjson)$")
+):
+    """List reservations in creation order.
 
-@api_router.get("/reservations/{reservation_id}", response_model=Reservation)
+    Pages are keyed on (created_at, id); when more results exist the next
+    page's cursor is returned in the X-Next-Cursor header. With
+    format=ndjson every matching reservation is streamed straight from the
+    database cursor, one JSON document per line, and limit/cursor only set
+    the starting point. Dates that were archived are listed from the archive.
+    """
+    collection = db.reservations
+    if date and await archiver.is_archived(date):
+        collection = db.reservations_archive
+    query = {}
+    if date:
+        query["date"] = date
+    if status:
+        query["status"] = status
+    if cursor:
+        query.update(decode_cursor(cursor))
+    sort = [("created_at", 1), ("id", 1)]
+    
+    if format == "ndjson":
+        docs = collection.find(query, RESERVATION_PROJECTION).sort(sort).batch_size(MAX_PAGE_SIZE)
+        # The read slot stays held while the cursor streams; the background
+        # task releases it too should the body never be iterated
+        return StreamingResponse(
+            stream_ndjson(docs, slot.keep()),
+            media_type="application/x-ndjson",
+            background=BackgroundTask(slot.release)
+        )
+    
+    # Fetch one extra document to know whether there is a next page
+    reservations = await collection.find(query, RESERVATION_PROJECTION).sort(sort).to_list(limit + 1)
+    headers = {}
+    if len(reservations) > limit:
+        reservations = reservations[:limit]
+        headers["X-Next-Cursor"] = encode_cursor(reservations[-1])
+    # Stored documents were validated on insert: encode them directly
+    return TrustedJSONResponse(reservations, headers=headers)
+
+# Fields returned by /api/reservations/search
+SEARCH_PROJECTION = {
+    "_id": 0, "id": 1, "name": 1, "email": 1, "phone": 1,
+    "date": 1, "time": 1, "guests": 1, "status": 1, "special_requests": 1
+}
+MAX_SEARCH_RESULTS = 100
+
+@api_router.get("/reservations/search", dependencies=[read_slot])
+async def search_reservations(
+    email: Optional[str] = None,
+    phone: Optional[str] = None,
+    name: Optional[str] = Query(None, min_length=2),
+    from_: Optional[str] = Query(None, alias="from"),
+    to: Optional[str] = None,
+    status: Optional[str] = None,
+    limit: int = Query(20, ge=1, le=MAX_SEARCH_RESULTS)
+):
+    """Reservations matching a guest's email, phone (digits only) and/or name prefix, by date.
+
+    At least one of email, phone or name is required. Archived reservations
+    are included when the range starts before the archive horizon.
+    """
+    if not (email or phone or name):
+        raise HTTPException(status_code=422, detail="email, phone or name is required")
+    for value in (from_, to):
+        if value:
+            try:
+                date.fromisoformat(value)
+            except ValueError:
+                raise HTTPException(status_code=422, detail="from and to must be ISO dates")
+    try:
+        query = guest_lookup.search_query(email, phone, name, from_, to, status)
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    sort = [("date", 1), ("time", 1)]
+    
+    if from_ and from_ >= archiver.cutoff():
+        results = await db.reservations.find(query, SEARCH_PROJECTION).sort(sort).limit(limit).to_list(None)
+        return TrustedJSONResponse(results)
+    
+    # The first `limit` of each collection, merged by date: archived matches
+    # are older, but a day being archived can be in both collections
+    hot, archived = await asyncio.gather(
+        db.reservations.find(query, SEARCH_PROJECTION).sort(sort).limit(limit).to_list(None),
+        db.reservations_archive.find(query, SEARCH_PROJECTION).sort(sort).limit(limit).to_list(None)
+    )
+    results, seen = [], set()
+    for reservation in heapq.merge(archived, hot, key=lambda res: (res["date"], res["time"])):
+        if reservation["id"] not in seen:
+            seen.add(reservation["id"])
+            results.append(reservation)
+    return TrustedJSONResponse(results[:limit])
+
+@api_router.get("/reservations/{reservation_id}", response_model=Reservation, dependencies=[read_slot])
 async def get_reservation(reservation_id: str):
-    reservation = await db.reservations.find_one({"id": reservation_id}, {"_id": 0})
+    reservation = await db.reservations.find_one({"id": reservation_id}, RESERVATION_PROJECTION)
+    if not reservation:
+        # Past reservations may have been archived
+        reservation = await db.reservations_archive.find_one({"id": reservation_id}, RESERVATION_PROJECTION)
     if not reservation:
         raise HTTPException(status_code=404, detail="Reservation not found")
-    return reservation
+    return TrustedJSONResponse(reservation)
 
-@api_router.delete("/reservations/{reservation_id}")
+@api_router.delete("/reservations/{reservation_id}", dependencies=[Depends(admission.limit("cancel", rate=0.5, burst=10)), write_slot])
 async def cancel_reservation(reservation_id: str):
-    result = await db.reservations.delete_one({"id": reservation_id})
-    if result.deleted_count == 0:
+    # Cancelled reservations are kept, marked as such, for the daily rollups
+    reservation = await db.reservations.find_one_and_update(
+        {"id": reservation_id, "status": {"$ne": CANCELLED}},
+        {
+            "$set": {"status": CANCELLED, "cancelled_at": datetime.now(timezone.utc).isoformat()},
+            "$push": {PENDING_FIELD: pending(RESERVATION_CANCELLED)}
+        },
+        projection={**RESERVATION_PROJECTION, "tables": 1}
+    )
+    if not reservation:
         raise HTTPException(status_code=404, detail="Reservation not found")
+    await release_party(
+        reservation["date"], reservation["time"], reservation["guests"],
+        seating.stored_tables(reservation)
+    )
+    outbox.notify()
+    await rollups.cancelled(reservation["date"], reservation["time"], reservation["guests"], reservation.get("status", CONFIRMED))
+    live.notify(reservation["date"])
     return {"message": "Reservation cancelled successfully"}
 
-@api_router.get("/available-times")
-async def get_available_times(date: str):
-    # Get all reservations for the date
-    reservations = await db.reservations.find({"date": date}, {"_id": 0}).to_list(100)
+@api_router.post("/reservations/{reservation_id}/no-show", dependencies=[write_slot])
+async def mark_no_show(reservation_id: str):
+    reservation = await db.reservations.find_one_and_update(
+        {"id": reservation_id, "status": CONFIRMED},
+        {"$set": {"status": NO_SHOW}},
+        projection={"_id": 0, "date": 1, "time": 1, "guests": 1}
+    )
+    if not reservation:
+        if await db.reservations.find_one({"id": reservation_id}, {"_id": 1}):
+            raise HTTPException(status_code=409, detail="Only confirmed reservations can be marked as no-show")
+        raise HTTPException(status_code=404, detail="Reservation not found")
+    await rollups.no_show(reservation["date"], reservation["time"], reservation["guests"])
+    return {"message": "Reservation marked as no-show"}
+
+def canonical_date(value: str) -> str:
+    """`value` as the YYYY-MM-DD key of the occupancy index; 422 if it is not a date."""
+    # fromisoformat also takes forms such as 20261102, stored under another key
+    try:
+        return date.fromisoformat(value).isoformat()
+    except ValueError:
+        raise HTTPException(status_code=422, detail="Invalid date")
+
+@api_router.get("/available-times", dependencies=[read_slot])
+async def get_available_times(date: str, guests: int = Query(1, ge=1, le=20)):
+    date = canonical_date(date)
+    slots = restaurant_schedule().day(date)
+    if slots.closed:
+        return {"lunch": [], "dinner": []}
     
-    # Define available time slots
-    lunch_slots = ["12:00", "12:30", "13:00", "13:30", "14:00"]
-    dinner_slots = ["19:00", "19:30", "20:00", "20:30", "21:00", "21:30"]
+    # Free covers and tables for the date come from the occupancy index
+    plan = DayPlan(await db.slot_occupancy.find_one({"_id": date}))
     
-    # Filter out fully booked slots (max 10 reservations per slot)
-    booked_times = {}
-    for res in reservations:
-        t = res.get("time", "")
-        booked_times[t] = booked_times.get(t, 0) + 1
+    # Keep the slots where the party can be seated for a whole sitting
+    return available_slots(plan, guests, slots)
+
+@api_router.get("/available-times/stream", dependencies=[Depends(admission.limit("live", rate=0.5, burst=10))])
+async def stream_available_times(date: str, guests: int = Query(1, ge=1, le=20)):
+    """Server-Sent Events: a snapshot of the date's slots, then a diff after every change.
+
+    Replaces polling /api/available-times: the slots are reloaded once per
+    change for all subscribers, instead of once per poll per browser tab.
+    """
+    date = canonical_date(date)
+    restaurant_schedule().day(date)
+    try:
+        live.check_capacity()
+    except SubscriberLimit:
+        raise HTTPException(status_code=503, detail="Too many live subscribers", headers={"Retry-After": "5"})
+    return StreamingResponse(
+        live.stream(date, guests),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@api_router.get("/availability", dependencies=[read_slot])
+async def get_availability(
+    from_: str = Query(..., alias="from"),
+    to: str = Query(...),
+    guests: int = Query(1, ge=1, le=20)
+):
+    try:
+        start, end = date.fromisoformat(from_), date.fromisoformat(to)
+    except ValueError:
+        raise HTTPException(status_code=422, detail="from and to must be ISO dates")
+    if end < start or (end - start).days >= MAX_AVAILABILITY_DAYS:
+        raise HTTPException(
+            status_code=422,
+            detail=f"to must be on or after from, within {MAX_AVAILABILITY_DAYS} days"
+        )
     
-    available_lunch = [t for t in lunch_slots if booked_times.get(t, 0) < 10]
-    available_dinner = [t for t in dinner_slots if booked_times.get(t, 0) < 10]
+    schedule = restaurant_schedule()
+    days = [(start + timedelta(days=i)).isoformat() for i in range((end - start).days + 1)]
+    slots = {day: schedule.day(day) for day in days}
+    open_days = [day for day in days if not slots[day].closed]
     
+    # One query fetches the occupancy of every open day in the range
+    occupancy = {
+        doc["_id"]: doc
+        async for doc in db.slot_occupancy.find({"_id": {"$in": open_days}})
+    }
+    
+    # Closed days are reported as null
     return {
-        "lunch": available_lunch,
-        "dinner": available_dinner
+        "guests": guests,
+        "days": {
+            day: None if slots[day].closed else available_slots(DayPlan(occupancy.get(day)), guests, slots[day])
+            for day in days
+        }
     }
 
-@api_router.post("/contact", response_model=ContactMessage)
-async def create_contact_message(input: ContactMessageCreate):
-    message = ContactMessage(
-        name=input.name,
-        email=input.email,
-        message=input.message
-    )
-    
-    doc = message.model_dump()
-    await db.contact_messages.insert_one(doc)
+# Longest range served by /api/analytics
+MAX_ANALYTICS_DAYS = 366
+
+@api_router.get("/analytics", dependencies=[read_slot])
+async def get_analytics(
+    from_: str = Query(..., alias="from"),
+    to: str = Query(...)
+):
+    """Covers, fill rates, average party size and no-show trend between two dates.
+
+    Reads only the daily rollups of the range; the aggregation runs in a
+    worker thread so it does not hold up the event loop.
+    """
+    try:
+        start, end = date.fromisoformat(from_), date.fromisoformat(to)
+    except ValueError:
+        raise HTTPException(status_code=422, detail="from and to must be ISO dates")
+    if end < start or (end - start).days >= MAX_ANALYTICS_DAYS:
+        raise HTTPException(
+            status_code=422,
+            detail=f"to must be on or after from, at most {MAX_ANALYTICS_DAYS} days later"
+        )
+    frame = await rollups.frame(start.isoformat(), end.isoformat())
+    return {"from": start.isoformat(), "to": end.isoformat(), **await run_in_threadpool(summarise, frame)}
+
+@api_router.post(
+    "/contact",
+    response_model=ContactMessage,
+    dependencies=[Depends(admission.limit("contact", rate=0.1, burst=5)), write_slot]
+)
+async def create_contact_message(
+    input: ContactMessageCreate,
+    idempotency_key: Optional[str] = Header(None, alias="Idempotency-Key")
+):
+    async def send():
+        message = ContactMessage(
+            name=input.name,
+            email=input.email,
+            message=input.message
+        )
+        
+        doc = message.model_dump()
+        if contact_buffer is not None:
+            try:
+                await contact_buffer.put(doc)
+            except BufferFull:
+                raise HTTPException(status_code=503, detail="Too many messages, please retry shortly")
+        else:
+            await db.contact_messages.insert_one(doc)
+        
+        return message
     
-    return message
+    return await idempotency.run("contact", idempotency_key, input, send)
+
+@api_router.get("/health/live")
+async def health_live():
+    # The process is up and its event loop is answering
+    return {"status": "alive"}
+
+@api_router.get("/health/ready")
+async def health_ready():
+    """Ready once startup completed and the content loaded, and while MongoDB answers a ping."""
+    if startup_seconds is None:
+        raise HTTPException(status_code=503, detail="Starting up")
+    # A failed content load is retried in the background; the menu and booking routes need it
+    if content.restaurant(DEFAULT_RESTAURANT) is None or DEFAULT_RESTAURANT not in schedules:
+        raise HTTPException(status_code=503, detail="Restaurant content not loaded")
+    try:
+        await asyncio.wait_for(db.command("ping"), READY_PING_TIMEOUT)
+    except (asyncio.TimeoutError, PyMongoError):
+        raise HTTPException(status_code=503, detail="MongoDB is unreachable")
+    return {"status": "ready", "startup_seconds": round(startup_seconds, 3)}
+
+@app.get("/metrics", include_in_schema=False)
+async def get_metrics():
+    return PlainTextResponse(REGISTRY.render(), media_type="text/plain; version=0.0.4")
 
 # Include the router in the main app
 app.include_router(api_router)
 
+# Per-route latency metrics; SLOW_REQUEST_MS enables the slow-request log
+slow_request_ms = os.environ.get('SLOW_REQUEST_MS')
+app.add_middleware(
+    MetricsMiddleware,
+    routes=app.router.routes,
+    slow_request_ms=float(slow_request_ms) if slow_request_ms else None
+)
+
 app.add_middleware(
     CORSMiddleware,
     allow_credentials=True,
@@ -252,6 +951,91 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
-@app.on_event("shutdown")
+# Startup and shutdown, run by the lifespan handler
+startup_duration = REGISTRY.register(Gauge("app_startup_seconds", "Time taken by the last startup"))
+# Set when startup completed, cleared on shutdown; /api/health/ready is 503 without it
+startup_seconds: Optional[float] = None
+# How long startup waits for MongoDB before giving up
+MONGO_STARTUP_TIMEOUT = float(os.environ.get('MONGO_STARTUP_TIMEOUT_SECONDS', '30'))
+READY_PING_TIMEOUT = float(os.environ.get('READY_PING_TIMEOUT_SECONDS', '1'))
+
+async def warm_up_connections():
+    """Wait for MongoDB to answer, then open the minimum pool so first requests find connections ready."""
+    deadline = perf_counter() + MONGO_STARTUP_TIMEOUT
+    while True:
+        try:
+            await db.command("ping")
+            break
+        except PyMongoError as e:
+            if perf_counter() >= deadline:
+                raise
+            logger.warning("Waiting for MongoDB: %s", e)
+            await asyncio.sleep(1)
+    # Concurrent commands each check out a connection, creating it if needed
+    await asyncio.gather(*(db.command("ping") for _ in range(mongo_min_pool_size)))
+
+async def load_content():
+    # The snapshot swap also builds the payloads, menu indexes and schedules
+    await content.seed()
+    try:
+        await content.refresh()
+    except Exception:
+        # Invalid stored content must not keep the app down: the background
+        # refresh retries it, and the routes needing it answer 503 meanwhile
+        logger.exception("Could not load the restaurant content, retrying in the background")
+    content.start()
+
+async def create_indexes():
+    await ensure_indexes(db)
+
+async def backfill_slot_occupancy():
+    # First start with the occupancy index: seed it from existing bookings
+    if await db.slot_occupancy.estimated_document_count() == 0:
+        await rebuild_slot_occupancy()
+
+async def backfill_guest_lookup():
+    # Reservations stored before guest search existed get its fields once
+    for collection in (db.reservations, db.reservations_archive):
+        await guest_lookup.backfill(collection)
+
+async def backfill_daily_rollups():
+    # First start with analytics: count the bookings taken so far
+    if await db.daily_rollups.estimated_document_count() == 0:
+        await rollups.rebuild(db)
+
+def start_background_tasks():
+    global contact_buffer
+    if os.environ.get('LIVE_CHANGE_STREAM') == '1':
+        live.watch(db.slot_occupancy)
+    if archiver.horizon_days > 0:
+        archiver.start()
+    if outbox.workers > 0:
+        outbox.start()
+    if os.environ.get('CONTACT_WRITE_BUFFER') == '1':
+        contact_buffer = WriteBuffer(db.contact_messages)
+        contact_buffer.start()
+
+async def startup():
+    global startup_seconds
+    started = perf_counter()
+    await warm_up_connections()
+    await asyncio.gather(create_indexes(), load_content())
+    await backfill_slot_occupancy()
+    await backfill_guest_lookup()
+    await backfill_daily_rollups()
+    start_background_tasks()
+    startup_seconds = perf_counter() - started
+    startup_duration.set(startup_seconds)
+    logger.info("Startup completed in %.1f ms", startup_seconds * 1000)
+
 async def shutdown_db_client():
+    global startup_seconds
+    # Not ready any more; write buffered messages before the connection goes away
+    startup_seconds = None
+    await content.stop()
+    await archiver.stop()
+    await outbox.stop()
+    await live.close()
+    if contact_buffer is not None:
+        await contact_buffer.close()
     client.close()
@@ -0,0 +1,70 @@
+"""Pre-encoded JSON responses for content that only changes between deploys.
+
+A `StaticPayload` serialises its content once, keeps gzip and (when the
+optional brotli package is installed) brotli variants next to the raw bytes,
+and derives a strong ETag from the content hash. Serving it is a header
+lookup: repeat visitors get a 304, everyone else gets bytes that are ready
+to write.
+"""
+import gzip
+import hashlib
+import json
+from typing import Dict
+
+from starlette.requests import Request
+from starlette.responses import Response
+
+try:
+    import brotli
+except ImportError:  # brotli is optional, gzip is always available
+    brotli = None
+
+CACHE_CONTROL = "public, no-cache"
+
+
+def _accepted_encodings(header: str) -> Dict[str, float]:
+    accepted = {}
+    for part in header.split(","):
+        name, _, params = part.strip().partition(";")
+        quality = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                quality = float(params[2:])
+            except ValueError:
+                quality = 0.0
+        if name:
+            accepted[name.strip().lower()] = quality
+    return accepted
+
+
+class StaticPayload:
+    __slots__ = ("body", "etag", "variants")
+
+    def __init__(self, content):
+        self.body = json.dumps(content, ensure_ascii=False, separators=(",", ":")).encode()
+        self.etag = '"' + hashlib.sha256(self.body).hexdigest()[:32] + '"'
+        # Preferred encodings first
+        self.variants = {}
+        if brotli is not None:
+            self.variants["br"] = brotli.compress(self.body, quality=11)
+        self.variants["gzip"] = gzip.compress(self.body, compresslevel=9, mtime=0)
+
+    def not_modified(self, request: Request) -> bool:
+        header = request.headers.get("if-none-match")
+        if not header:
+            return False
+        tags = [tag.strip().removeprefix("W/") for tag in header.split(",")]
+        return "*" in tags or self.etag in tags
+
+    def response(self, request: Request) -> Response:
+        headers = {"ETag": self.etag, "Cache-Control": CACHE_CONTROL, "Vary": "Accept-Encoding"}
+        if self.not_modified(request):
+            return Response(status_code=304, headers=headers)
+
+        accepted = _accepted_encodings(request.headers.get("accept-encoding", ""))
+        for encoding, body in self.variants.items():
+            if accepted.get(encoding, 0) > 0:
+                headers["Content-Encoding"] = encoding
+                return Response(body, media_type="application/json", headers=headers)
+        return Response(self.body, media_type="application/json", headers=headers)
@@ -0,0 +1,117 @@
+"""Write-coalescing buffer for insert-only collections.
+
+Documents are queued in memory and written with one unordered insert_many
+whenever `max_batch` documents are waiting or `flush_interval` seconds have
+passed since the first of them arrived. The queue is bounded: when it is
+full, `put` waits up to `put_timeout` and then raises `BufferFull`, so
+callers can shed load instead of growing memory. A batch the database
+cannot take is retried with capped exponential backoff until it is written,
+meanwhile the queue fills up and `put` sheds load. `close` writes everything
+still queued before returning; only then, after `retries` more attempts, is a
+batch given up.
+"""
+import asyncio
+import logging
+from typing import List, Optional
+
+from motor.motor_asyncio import AsyncIOMotorCollection
+from pymongo.errors import BulkWriteError, PyMongoError
+
+logger = logging.getLogger(__name__)
+
+# Sent through the queue by close() to stop the flusher after what precedes it
+_CLOSE = object()
+
+
+class BufferFull(Exception):
+    pass
+
+
+class WriteBuffer:
+    def __init__(
+        self,
+        collection: AsyncIOMotorCollection,
+        max_batch: int = 100,
+        flush_interval: float = 0.25,
+        max_pending: int = 5000,
+        put_timeout: float = 1.0,
+        retries: int = 3,
+        max_delay: float = 5.0
+    ):
+        self.collection = collection
+        self.max_batch = max_batch
+        self.flush_interval = flush_interval
+        self.put_timeout = put_timeout
+        self.retries = retries
+        self.max_delay = max_delay
+        self._queue: asyncio.Queue = asyncio.Queue(maxsize=max_pending)
+        self._task: Optional[asyncio.Task] = None
+        self._closing = False
+
+    def start(self):
+        self._task = asyncio.create_task(self._run())
+
+    async def put(self, doc: dict):
+        if self._closing:
+            raise BufferFull("Write buffer is shutting down")
+        try:
+            await asyncio.wait_for(self._queue.put(doc), self.put_timeout)
+        except asyncio.TimeoutError:
+            raise BufferFull("Write buffer is full")
+
+    async def close(self):
+        """Stop accepting documents and wait until every queued one is written."""
+        if self._task is None or self._closing:
+            return
+        self._closing = True
+        await self._queue.put(_CLOSE)
+        await self._task
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            item = await self._queue.get()
+            if item is _CLOSE:
+                return
+            batch = [item]
+            deadline = loop.time() + self.flush_interval
+            closing = False
+            while len(batch) < self.max_batch:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    item = await asyncio.wait_for(self._queue.get(), timeout)
+                except asyncio.TimeoutError:
+                    break
+                if item is _CLOSE:
+                    closing = True
+                    break
+                batch.append(item)
+            await self._flush(batch)
+            if closing:
+                return
+
+    async def _flush(self, batch: List[dict]):
+        attempt = 0
+        while True:
+            attempt += 1
+            try:
+                await self.collection.insert_many(batch, ordered=False)
+                return
+            except BulkWriteError as e:
+                # Duplicates of documents written by an earlier attempt are fine
+                errors = [error for error in e.details["writeErrors"] if error["code"] != 11000]
+                if not errors:
+                    return
+                logger.error("Buffered insert into %s rejected %d documents: %s",
+                             self.collection.name, len(errors), errors[0]["errmsg"])
+                return
+            except PyMongoError:
+                if self._closing and attempt >= self.retries:
+                    logger.exception("Dropping %d buffered documents for %s",
+                                     len(batch), self.collection.name)
+                    return
+                if attempt == 1:
+                    logger.exception("Buffered insert into %s failed, retrying", self.collection.name)
+                await asyncio.sleep(min(self.max_delay, 0.1 * 2 ** attempt))
@@ -0,0 +1,457 @@
+"""Concurrent load benchmark for the Le Gros Arbre API.
+
+Runs the FastAPI app in-process (through its ASGI interface, including
+startup/shutdown) against a throwaway database, or against a running server
+with --url, and drives a weighted mix of requests from asyncio workers.
+Reports p50/p95/p99 latency and requests per second per route, plus the
+cold-start import and startup times, and saves the results as JSON so runs
+can be compared between commits.
+
+    python backend_bench.py run --scenario mixed --concurrency 64 --duration 20
+    python backend_bench.py run --mock                     # mongomock_motor instead of MongoDB
+    python backend_bench.py run --url http://localhost:8001 # needs httpx
+    python backend_bench.py compare test_reports/bench/a.json test_reports/bench/b.json
+    python backend_bench.py serialisation --documents 1000 # response_model vs trusted encoding
+
+In-process runs use MONGO_URL (default mongodb://localhost:27017) with a
+fresh bench_* database that is dropped afterwards.
+"""
+import argparse
+import asyncio
+import gzip
+import json
+import os
+import random
+import subprocess
+import sys
+import time
+from datetime import date, datetime, timedelta, timezone
+from pathlib import Path
+
+ROOT_DIR = Path(__file__).parent
+RESULTS_DIR = ROOT_DIR / "test_reports" / "bench"
+
+# Operation weights of each scenario
+SCENARIOS = {
+    "mixed": {
+        "menu": 30, "info": 10, "reviews": 10, "available_times": 25,
+        "calendar": 5, "book": 10, "hot_book": 5, "cancel": 5,
+    },
+    "reads": {"menu": 40, "info": 20, "reviews": 20, "available_times": 20},
+    "hot-slot": {"hot_book": 100},
+    "booking": {"book": 60, "cancel": 30, "available_times": 10},
+}
+
+
+class ASGIClient:
+    """Minimal in-process HTTP client that calls an ASGI app directly."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def request(self, method, path, params=None, json_body=None, headers=None):
+        query = "&".join(f"{k}={v}" for k, v in (params or {}).items())
+        body = json.dumps(json_body).encode() if json_body is not None else b""
+        raw_headers = [(b"host", b"bench"), (b"accept-encoding", b"gzip")]
+        if json_body is not None:
+            raw_headers.append((b"content-type", b"application/json"))
+        for name, value in (headers or {}).items():
+            raw_headers.append((name.lower().encode(), value.encode()))
+        scope = {
+            "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1",
+            "method": method, "scheme": "http", "path": path, "raw_path": path.encode(),
+            "query_string": query.encode(), "root_path": "", "headers": raw_headers,
+            "client": ("127.0.0.1", 50000), "server": ("bench", 80),
+        }
+        sent = False
+        response = {"status": None, "body": b"", "gzip": False}
+
+        async def receive():
+            nonlocal sent
+            if not sent:
+                sent = True
+                return {"type": "http.request", "body": body, "more_body": False}
+            # No disconnect until the app is done with the request
+            await asyncio.Event().wait()
+
+        async def send(message):
+            if message["type"] == "http.response.start":
+                response["status"] = message["status"]
+                response["gzip"] = (b"content-encoding", b"gzip") in message.get("headers", [])
+            elif message["type"] == "http.response.body":
+                response["body"] += message.get("body", b"")
+
+        await self.app(scope, receive, send)
+        if response["gzip"]:
+            return response["status"], gzip.decompress(response["body"])
+        return response["status"], response["body"]
+
+    async def __aenter__(self):
+        self._inbox, self._outbox = asyncio.Queue(), asyncio.Queue()
+        self._lifespan = asyncio.create_task(
+            self.app({"type": "lifespan", "asgi": {"version": "3.0"}}, self._inbox.get, self._outbox.put)
+        )
+        await self._inbox.put({"type": "lifespan.startup"})
+        message = await self._outbox.get()
+        if message["type"] != "lifespan.startup.complete":
+            raise RuntimeError(f"Startup failed: {message.get('message')}")
+        return self
+
+    async def __aexit__(self, *exc):
+        await self._inbox.put({"type": "lifespan.shutdown"})
+        await self._outbox.get()
+        await self._lifespan
+
+
+class HTTPClient:
+    """Client for a server running elsewhere (requires httpx)."""
+
+    def __init__(self, base_url):
+        import httpx
+        self._client = httpx.AsyncClient(base_url=base_url, timeout=30)
+
+    async def request(self, method, path, params=None, json_body=None, headers=None):
+        response = await self._client.request(method, path, params=params, json=json_body, headers=headers)
+        return response.status_code, response.content
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        await self._client.aclose()
+
+
+class Workload:
+    """Generates requests; `route` labels group latencies per endpoint."""
+
+    def __init__(self, client, days, slots, seed):
+        self.client = client
+        self.days = days
+        self.slots = slots
+        self.random = random.Random(seed)
+        self.booked = []
+        self.hot_day, self.hot_slot = days[0], slots[-1]
+
+    def _guest(self, day, slot):
+        return {
+            "name": "Bench Guest", "email": "bench@example.com", "phone": "0600000000",
+            "date": day, "time": slot, "guests": self.random.randint(1, 6),
+        }
+
+    async def menu(self):
+        return "GET /api/menu", await self.client.request("GET", "/api/menu")
+
+    async def info(self):
+        return "GET /api/info", await self.client.request("GET", "/api/info")
+
+    async def reviews(self):
+        return "GET /api/reviews", await self.client.request("GET", "/api/reviews")
+
+    async def available_times(self):
+        params = {"date": self.random.choice(self.days), "guests": self.random.randint(1, 6)}
+        return "GET /api/available-times", await self.client.request("GET", "/api/available-times", params)
+
+    async def calendar(self):
+        params = {"from": self.days[0], "to": self.days[-1]}
+        return "GET /api/availability", await self.client.request("GET", "/api/availability", params)
+
+    async def book(self):
+        body = self._guest(self.random.choice(self.days), self.random.choice(self.slots))
+        status, content = await self.client.request("POST", "/api/reservations", json_body=body)
+        if status == 200:
+            self.booked.append(json.loads(content)["id"])
+        return "POST /api/reservations", (status, content)
+
+    async def hot_book(self):
+        body = self._guest(self.hot_day, self.hot_slot)
+        status, content = await self.client.request("POST", "/api/reservations", json_body=body)
+        if status == 200:
+            self.booked.append(json.loads(content)["id"])
+        return "POST /api/reservations (hot slot)", (status, content)
+
+    async def cancel(self):
+        if not self.booked:
+            return await self.book()
+        reservation_id = self.booked.pop(self.random.randrange(len(self.booked)))
+        return "DELETE /api/reservations/{id}", await self.client.request("DELETE", f"/api/reservations/{reservation_id}")
+
+
+def percentile(ordered, p):
+    if not ordered:
+        return 0.0
+    rank = max(0, min(len(ordered) - 1, int(round(p / 100 * len(ordered))) - 1))
+    return ordered[rank]
+
+
+def summarise(samples, elapsed):
+    routes = {}
+    for route, latency, status in samples:
+        entry = routes.setdefault(route, {"latencies": [], "statuses": {}})
+        entry["latencies"].append(latency)
+        entry["statuses"][str(status)] = entry["statuses"].get(str(status), 0) + 1
+    report = {}
+    for route, entry in sorted(routes.items()):
+        ordered = sorted(entry["latencies"])
+        report[route] = {
+            "count": len(ordered),
+            "rps": round(len(ordered) / elapsed, 1),
+            "p50_ms": round(percentile(ordered, 50) * 1000, 3),
+            "p95_ms": round(percentile(ordered, 95) * 1000, 3),
+            "p99_ms": round(percentile(ordered, 99) * 1000, 3),
+            "max_ms": round(ordered[-1] * 1000, 3),
+            "statuses": entry["statuses"],
+        }
+    ordered = sorted(latency for _, latency, _ in samples)
+    total = {
+        "count": len(ordered),
+        "rps": round(len(ordered) / elapsed, 1),
+        "p50_ms": round(percentile(ordered, 50) * 1000, 3),
+        "p95_ms": round(percentile(ordered, 95) * 1000, 3),
+        "p99_ms": round(percentile(ordered, 99) * 1000, 3),
+    }
+    return report, total
+
+
+async def open_days(client, count):
+    """The next `count` dates the restaurant is open, according to /api/info."""
+    status, content = await client.request("GET", "/api/info")
+    hours = json.loads(content)["hours"] if status == 200 else {}
+    weekdays = ["monday", "tuesday", "wednesday", "thursday", "friday", "saturday", "sunday"]
+    days, day = [], date.today() + timedelta(days=1)
+    while len(days) < count:
+        if hours.get(weekdays[day.weekday()]) != "Fermé":
+            days.append(day.isoformat())
+        day += timedelta(days=1)
+    return days
+
+
+async def drive(client, args):
+    weights = SCENARIOS[args.scenario]
+    days = await open_days(client, args.days)
+    status, content = await client.request("GET", "/api/available-times", {"date": days[0]})
+    slots = [slot for service in json.loads(content).values() for slot in service]
+    workload = Workload(client, days, slots, args.seed)
+    operations = [getattr(workload, name) for name in weights]
+    chooser = random.Random(args.seed)
+
+    samples = []
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + args.duration
+
+    async def worker():
+        while loop.time() < deadline:
+            operation = chooser.choices(operations, weights=list(weights.values()))[0]
+            started = time.perf_counter()
+            try:
+                route, (status, _) = await operation()
+            except Exception as e:
+                route, status = operation.__name__, type(e).__name__
+            samples.append((route, time.perf_counter() - started, status))
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(args.concurrency)))
+    return samples, time.perf_counter() - started
+
+
+async def run_in_process(args):
+    database = f"bench_{int(time.time())}"
+    os.environ.setdefault("MONGO_URL", "mongodb://localhost:27017")
+    os.environ["DB_NAME"] = database
+    # Every simulated client shares one address, so per-client limits would throttle the run
+    if not args.rate_limits:
+        os.environ["RATE_LIMITS"] = "off"
+    if args.mock:
+        import motor.motor_asyncio
+        from mongomock_motor import AsyncMongoMockClient
+        motor.motor_asyncio.AsyncIOMotorClient = AsyncMongoMockClient
+    sys.path.insert(0, str(ROOT_DIR / "backend"))
+    started = time.perf_counter()
+    import server
+    imported = time.perf_counter()
+
+    try:
+        async with ASGIClient(server.app) as client:
+            # Cold start: module import, then the lifespan startup
+            startup = {
+                "import_s": round(imported - started, 3),
+                "startup_s": round(time.perf_counter() - imported, 3),
+            }
+            samples, elapsed = await drive(client, args)
+            return samples, elapsed, startup
+    finally:
+        if not args.mock:
+            from motor.motor_asyncio import AsyncIOMotorClient
+            cleanup = AsyncIOMotorClient(os.environ["MONGO_URL"])
+            await cleanup.drop_database(database)
+            cleanup.close()
+
+
+async def run(args):
+    if args.url:
+        async with HTTPClient(args.url) as client:
+            # The server reports how long its own startup took
+            status, content = await client.request("GET", "/api/health/ready")
+            startup = {"startup_s": json.loads(content).get("startup_seconds")} if status == 200 else {}
+            samples, elapsed = await drive(client, args)
+    else:
+        samples, elapsed, startup = await run_in_process(args)
+    return samples, elapsed, startup
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT_DIR, text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def print_report(report, total):
+    print(f"{'route':<36} {'count':>7} {'rps':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8}  statuses")
+    for route, stats in report.items():
+        statuses = " ".join(f"{code}:{n}" for code, n in sorted(stats["statuses"].items()))
+        print(f"{route:<36} {stats['count']:>7} {stats['rps']:>8} {stats['p50_ms']:>8} "
+              f"{stats['p95_ms']:>8} {stats['p99_ms']:>8}  {statuses}")
+    print(f"{'TOTAL':<36} {total['count']:>7} {total['rps']:>8} {total['p50_ms']:>8} "
+          f"{total['p95_ms']:>8} {total['p99_ms']:>8}")
+
+
+def command_run(args):
+    samples, elapsed, startup = asyncio.run(run(args))
+    report, total = summarise(samples, elapsed)
+    print_report(report, total)
+    if startup:
+        print("\nStartup: " + ", ".join(f"{name} {value}" for name, value in startup.items()))
+
+    commit = git_commit()
+    result = {
+        "meta": {
+            "commit": commit,
+            "timestamp": datetime.now(timezone.utc).isoformat(),
+            "scenario": args.scenario,
+            "concurrency": args.concurrency,
+            "duration_s": round(elapsed, 3),
+            "target": args.url or ("in-process (mongomock)" if args.mock else "in-process"),
+            **startup,
+        },
+        "routes": report,
+        "total": total,
+    }
+    output = Path(args.output) if args.output else (
+        RESULTS_DIR / f"{datetime.now():%Y%m%d-%H%M%S}-{commit}-{args.scenario}.json"
+    )
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps(result, indent=2))
+    print(f"\nSaved {output}")
+    return 0
+
+
+def command_compare(args):
+    old, new = (json.loads(Path(path).read_text()) for path in (args.old, args.new))
+    print(f"{old['meta']['commit']} -> {new['meta']['commit']}")
+    print(f"{'route':<36} {'rps':>16} {'p50 ms':>18} {'p95 ms':>18} {'p99 ms':>18}")
+    regressions = 0
+    rows = list(new["routes"].items()) + [("TOTAL", new["total"])]
+    for route, stats in rows:
+        before = old["total"] if route == "TOTAL" else old["routes"].get(route)
+        if before is None:
+            print(f"{route:<36} (new)")
+            continue
+        cells = []
+        for key in ("rps", "p50_ms", "p95_ms", "p99_ms"):
+            change = (stats[key] - before[key]) / before[key] * 100 if before[key] else 0.0
+            # Higher is better for rps, lower is better for latencies
+            worse = change < -args.threshold if key == "rps" else change > args.threshold
+            regressions += worse
+            cells.append(f"{stats[key]:>9} {change:+6.1f}%{'!' if worse else ' '}")
+        print(f"{route:<36} " + " ".join(cells))
+    for key in ("import_s", "startup_s"):
+        if old["meta"].get(key) is not None and new["meta"].get(key) is not None:
+            print(f"{key:<36} {old['meta'][key]} -> {new['meta'][key]}")
+    if regressions:
+        print(f"\n{regressions} metric(s) regressed by more than {args.threshold}%")
+    return 1 if regressions else 0
+
+
+def command_serialisation(args):
+    """Time GET /api/reservations' response encoding: response_model re-validation vs trusted bytes."""
+    os.environ.setdefault("MONGO_URL", "mongodb://localhost:27017")
+    os.environ.setdefault("DB_NAME", "bench")
+    sys.path.insert(0, str(ROOT_DIR / "backend"))
+    import fastjson
+    import server
+    from fastapi.responses import JSONResponse
+    from fastapi.routing import serialize_response
+
+    route = next(
+        r for r in server.app.routes
+        if getattr(r, "path", None) == "/api/reservations" and "GET" in r.methods
+    )
+    docs = [
+        server.Reservation(
+            name=f"Guest {i}", email=f"guest{i}@example.com", phone="06 00 00 00 00",
+            date="2026-06-12", time="19:30", guests=1 + i % 6,
+            special_requests="Table en terrasse" if i % 3 == 0 else None
+        ).model_dump()
+        for i in range(args.documents)
+    ]
+
+    async def validated():
+        content = await serialize_response(field=route.response_field, response_content=docs)
+        return JSONResponse(content).body
+
+    async def trusted():
+        return fastjson.TrustedJSONResponse(docs).body
+
+    async def measure(encode):
+        await encode()
+        started = time.perf_counter()
+        for _ in range(args.repeat):
+            body = await encode()
+        return (time.perf_counter() - started) / args.repeat, len(body)
+
+    print(f"{args.documents} documents, {args.repeat} repetitions, encoder: "
+          f"{'orjson' if fastjson.orjson else 'json'}")
+    results = {}
+    for name, encode in (("response_model", validated), ("trusted", trusted)):
+        seconds, size = asyncio.run(measure(encode))
+        results[name] = seconds
+        print(f"{name:<16} {seconds * 1000:>9.3f} ms/response {size:>9} bytes")
+    print(f"speedup          {results['response_model'] / results['trusted']:>9.1f}x")
+    return 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    run_parser = commands.add_parser("run", help="run a benchmark and save its results")
+    run_parser.add_argument("--scenario", choices=sorted(SCENARIOS), default="mixed")
+    run_parser.add_argument("--concurrency", type=int, default=32)
+    run_parser.add_argument("--duration", type=float, default=10.0, help="seconds")
+    run_parser.add_argument("--days", type=int, default=30, help="open days to spread bookings over")
+    run_parser.add_argument("--seed", type=int, default=1)
+    run_parser.add_argument("--url", help="benchmark a running server instead of the in-process app")
+    run_parser.add_argument("--mock", action="store_true", help="use mongomock_motor instead of MongoDB")
+    run_parser.add_argument("--rate-limits", action="store_true", help="keep per-client rate limits on (in-process)")
+    run_parser.add_argument("--output", help="results file (default: test_reports/bench/...)")
+    run_parser.set_defaults(handler=command_run)
+
+    compare_parser = commands.add_parser("compare", help="compare two saved results")
+    compare_parser.add_argument("old")
+    compare_parser.add_argument("new")
+    compare_parser.add_argument("--threshold", type=float, default=10.0, help="regression threshold in percent")
+    compare_parser.set_defaults(handler=command_compare)
+
+    serialisation_parser = commands.add_parser(
+        "serialisation", help="compare response_model and trusted encoding of reservation lists"
+    )
+    serialisation_parser.add_argument("--documents", type=int, default=1000)
+    serialisation_parser.add_argument("--repeat", type=int, default=50)
+    serialisation_parser.set_defaults(handler=command_serialisation)
+
+    args = parser.parse_args()
+    return args.handler(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
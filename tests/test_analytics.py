@@ -0,0 +1,60 @@
+import asyncio
+
+import pytest
+
+mongomock_motor = pytest.importorskip("mongomock_motor")
+
+from analytics import CANCELLED, Rollups, rollup  # noqa: E402
+from archive import Archiver  # noqa: E402
+
+
+def reservation(day, time="19:00", guests=2, status="confirmed", id=None):
+    return {"id": id or f"{day}-{time}-{guests}", "date": day, "time": time, "guests": guests, "status": status}
+
+
+def run(coroutine):
+    return asyncio.run(coroutine)
+
+
+def test_rollup_counts_per_slot():
+    summary = rollup([
+        reservation("2026-01-05", "19:00", 4),
+        reservation("2026-01-05", "19:00", 2, "no_show"),
+        reservation("2026-01-05", "12:00", 3, CANCELLED),
+    ])
+    assert (summary["covers"], summary["bookings"], summary["cancellations"]) == (6, 2, 1)
+    assert (summary["no_shows"], summary["no_show_covers"]) == (1, 2)
+    assert list(summary["slots"]) == ["12:00", "19:00"]
+    assert summary["slots"]["12:00"]["covers"] == 0
+
+
+def test_rebuild_marks_days_only_in_the_archive_as_archived():
+    async def scenario():
+        db = mongomock_motor.AsyncMongoMockClient()["analytics_tests"]
+        await db.reservations.insert_many([reservation("2020-01-07"), reservation("2099-01-01")])
+        await db.reservations_archive.insert_many([reservation("2020-01-06", guests=5)])
+        written = await Rollups(db.daily_rollups).rebuild(db)
+        archiver = Archiver(db, horizon_days=30)
+        docs = {doc["_id"]: doc async for doc in db.daily_rollups.find()}
+        return written, docs, [await archiver.is_archived(day) for day in ("2020-01-06", "2020-01-07")]
+
+    written, docs, archived = run(scenario())
+    assert written == 3
+    assert docs["2020-01-06"]["covers"] == 5
+    assert "archived_at" in docs["2020-01-06"]
+    assert "archived_at" not in docs["2020-01-07"]
+    assert archived == [True, False]
+
+
+def test_rebuild_keeps_archived_days_from_the_archive():
+    async def scenario():
+        db = mongomock_motor.AsyncMongoMockClient()["analytics_tests"]
+        await db.daily_rollups.insert_one({"_id": "2020-01-06", "covers": 99, "archived_at": "2020-02-06"})
+        # A leftover hot copy of an archived day is not counted twice
+        await db.reservations.insert_one(reservation("2020-01-06", guests=5))
+        await db.reservations_archive.insert_one(reservation("2020-01-06", guests=5))
+        await Rollups(db.daily_rollups).rebuild(db)
+        return await db.daily_rollups.find_one({"_id": "2020-01-06"})
+
+    doc = run(scenario())
+    assert (doc["covers"], doc["bookings"], doc["archived_at"]) == (5, 1, "2020-02-06")
@@ -0,0 +1,112 @@
+import asyncio
+from datetime import date, timedelta
+
+import pytest
+
+mongomock_motor = pytest.importorskip("mongomock_motor")
+
+from archive import Archiver  # noqa: E402
+
+
+def run(coroutine):
+    return asyncio.run(coroutine)
+
+
+def days_ago(n: int) -> str:
+    return (date.today() - timedelta(days=n)).isoformat()
+
+
+OLD, OLDER, RECENT = days_ago(40), days_ago(41), days_ago(5)
+
+
+def reservations():
+    return [
+        {"id": "a", "date": OLD, "time": "19:00", "guests": 4, "status": "confirmed"},
+        {"id": "b", "date": OLD, "time": "19:00", "guests": 2, "status": "no_show"},
+        {"id": "c", "date": OLD, "time": "12:30", "guests": 3, "status": "cancelled"},
+        {"id": "d", "date": OLDER, "time": "20:00", "guests": 6, "status": "confirmed"},
+        {"id": "e", "date": RECENT, "time": "19:00", "guests": 2, "status": "confirmed"},
+    ]
+
+
+async def make_db():
+    db = mongomock_motor.AsyncMongoMockClient()["archive_tests"]
+    await db.reservations.insert_many(reservations())
+    await db.slot_occupancy.insert_many([{"_id": day, "slots": {}} for day in (OLD, OLDER, RECENT)])
+    return db
+
+
+async def state(db):
+    return {
+        "hot": sorted([doc["id"] async for doc in db.reservations.find()]),
+        "archive": sorted([doc["id"] async for doc in db.reservations_archive.find()]),
+        "occupancy": sorted([doc["_id"] async for doc in db.slot_occupancy.find()]),
+        "rollups": {doc.pop("_id"): doc async for doc in db.daily_rollups.find()},
+    }
+
+
+def test_run_once_archives_days_before_the_cutoff():
+    async def scenario():
+        db = await make_db()
+        archiver = Archiver(db, horizon_days=30, batch_size=2)
+        archived = await archiver.run_once()
+        return archived, await state(db), [await archiver.is_archived(day) for day in (OLD, OLDER, RECENT)]
+
+    archived, result, flags = run(scenario())
+    assert archived == 2
+    assert result["hot"] == ["e"]
+    assert result["archive"] == ["a", "b", "c", "d"]
+    assert result["occupancy"] == [RECENT]
+    assert flags == [True, True, False]
+
+
+def test_archive_day_writes_the_rollup():
+    async def scenario():
+        db = await make_db()
+        await Archiver(db, horizon_days=30).archive_day(OLD)
+        return await db.daily_rollups.find_one({"_id": OLD})
+
+    rollup = run(scenario())
+    assert "archived_at" in rollup
+    assert (rollup["covers"], rollup["bookings"], rollup["cancellations"]) == (6, 2, 1)
+    assert (rollup["no_shows"], rollup["no_show_covers"]) == (1, 2)
+    assert rollup["slots"]["19:00"]["covers"] == 6
+    assert rollup["slots"]["12:30"]["cancellations"] == 1
+
+
+def test_archiving_again_changes_nothing():
+    async def scenario():
+        db = await make_db()
+        archiver = Archiver(db, horizon_days=30)
+        await archiver.run_once()
+        first = await state(db)
+        await archiver.archive_day(OLD)
+        again = await archiver.run_once()
+        return first, again, await state(db)
+
+    first, again, second = run(scenario())
+    assert again == 0
+    for rollup in (*first["rollups"].values(), *second["rollups"].values()):
+        rollup.pop("archived_at")
+    assert first == second
+
+
+@pytest.mark.parametrize("copied, deleted", [
+    # Interrupted while copying
+    (["a"], []),
+    # Copied and rolled up, interrupted while deleting
+    (["a", "b", "c"], ["a", "b"]),
+])
+def test_interrupted_run_is_completed(copied, deleted):
+    async def scenario():
+        db = await make_db()
+        docs = {doc["id"]: doc async for doc in db.reservations.find({"date": OLD})}
+        await db.reservations_archive.insert_many([docs[id] for id in copied])
+        await db.reservations.delete_many({"id": {"$in": deleted}})
+        await Archiver(db, horizon_days=30).run_once()
+        return await state(db)
+
+    result = run(scenario())
+    assert result["hot"] == ["e"]
+    assert result["archive"] == ["a", "b", "c", "d"]
+    assert result["rollups"][OLD]["bookings"] == 2
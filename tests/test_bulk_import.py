@@ -0,0 +1,60 @@
+import asyncio
+
+import pytest
+
+from bulk_import import iter_rows
+
+
+async def _chunks(data: bytes, size: int):
+    for i in range(0, len(data), size):
+        yield data[i:i + size]
+
+
+def rows(data: bytes, ndjson: bool = False, size: int = 1):
+    async def collect():
+        return [row async for row in iter_rows(_chunks(data, size), ndjson)]
+
+    return asyncio.run(collect())
+
+
+ARRAY = '[{"name": "Zoé Lefèvre", "guests": 2}, 12345, "a, ]", [1, 2], {"nested": {"x": [3]}}]'.encode()
+EXPECTED = [{"name": "Zoé Lefèvre", "guests": 2}, 12345, "a, ]", [1, 2], {"nested": {"x": [3]}}]
+
+
+@pytest.mark.parametrize("size", [1, 2, 3, 7, 64, len(ARRAY)])
+def test_array_split_at_any_boundary(size):
+    # Size 1 splits the multi-byte characters and the number too
+    assert rows(ARRAY, size=size) == EXPECTED
+
+
+def test_empty_array():
+    assert rows(b"  [ ]\n") == []
+
+
+@pytest.mark.parametrize("size", [1, 5, 1000])
+def test_ndjson_lines(size):
+    data = b'{"id": 1}\n\n{"id": "\xc3\xa9"}\r\n{"id": 3}'
+    assert rows(data, ndjson=True, size=size) == [{"id": 1}, {"id": "é"}, {"id": 3}]
+
+
+@pytest.mark.parametrize("data", [
+    b'{"id": 1}',
+    b'[{"id": 1} {"id": 2}]',
+    b'[{"id": 1}, {"id": 2}',
+    b'[{"id": 1}] trailing',
+    b'[{"id": ]',
+])
+def test_malformed_array(data):
+    with pytest.raises(ValueError):
+        rows(data, size=4)
+
+
+def test_rows_before_the_error_are_yielded():
+    async def collect():
+        seen = []
+        with pytest.raises(ValueError):
+            async for row in iter_rows(_chunks(b'{"id": 1}\n{"id": \n', 3), True):
+                seen.append(row)
+        return seen
+
+    assert asyncio.run(collect()) == [{"id": 1}]
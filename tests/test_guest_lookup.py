@@ -0,0 +1,91 @@
+import asyncio
+import re
+
+import pytest
+
+import guest_lookup
+from guest_lookup import lookup_fields, normalise_email, phone_digits, search_query
+
+
+@pytest.mark.parametrize("phone", [
+    "07 65 87 29 34",
+    "07.65.87.29.34",
+    "07-65-87-29-34",
+    "0765872934",
+    "+33 7 65 87 29 34",
+    "+33765872934",
+    "+33 (0)7 65 87 29 34",
+    "+33 07 65 87 29 34",
+    "0033 7 65 87 29 34",
+    "0033 (0)7 65 87 29 34",
+    " +33 7 65 87 29 34 ",
+])
+def test_phone_formats_share_their_digits(phone):
+    assert phone_digits(phone) == "0765872934"
+
+
+def test_foreign_numbers_keep_their_prefix():
+    assert phone_digits("+44 20 7946 0958") == "442079460958"
+    assert phone_digits("0044 20 7946 0958") == "00442079460958"
+
+
+def test_email_is_trimmed_and_case_folded():
+    assert normalise_email("  Jean.Dupont@Example.FR ") == "jean.dupont@example.fr"
+
+
+def test_lookup_fields():
+    assert lookup_fields("Zoé Lefèvre-Dupont", "Z@X.fr", "+33 6 12 34 56 78") == {
+        "email_norm": "z@x.fr",
+        "phone_digits": "0612345678",
+        "name_tokens": ["zoe", "lefevre", "dupont"],
+    }
+
+
+def test_search_query_on_every_filter():
+    query = search_query(
+        email=" Z@X.fr", phone="+33 (0)6 12 34 56 78", name="Lefè", date_from="2026-01-01",
+        date_to="2026-12-31", status="confirmed"
+    )
+    assert query == {
+        "email_norm": "z@x.fr",
+        "phone_digits": "0612345678",
+        "$and": [{"name_tokens": re.compile("^lefe")}],
+        "date": {"$gte": "2026-01-01", "$lte": "2026-12-31"},
+        "status": "confirmed",
+    }
+
+
+def test_search_query_name_words_are_anchored_prefixes():
+    words = search_query(name="jean d.")["$and"]
+    assert [word["name_tokens"].pattern for word in words] == ["^jean", "^d"]
+    assert search_query(name="a+b")["$and"][1]["name_tokens"].match("b")
+
+
+def test_search_query_open_date_range():
+    assert search_query(email="a@b.fr", date_from="2026-01-01") == {
+        "email_norm": "a@b.fr", "date": {"$gte": "2026-01-01"}
+    }
+
+
+def test_search_query_rejects_a_name_without_words():
+    with pytest.raises(ValueError):
+        search_query(name="--")
+
+
+def test_backfill_fixes_doubled_trunk_zero():
+    mongomock_motor = pytest.importorskip("mongomock_motor")
+
+    async def scenario():
+        collection = mongomock_motor.AsyncMongoMockClient()["guest_lookup_tests"]["reservations"]
+        await collection.insert_many([
+            {"_id": 1, "name": "Jean", "email": "j@x.fr", "phone": "+33 (0)7 65 87 29 34", "phone_digits": "00765872934"},
+            {"_id": 2, "name": "Ann", "email": "a@x.uk", "phone": "0044 20 7946 0958", "phone_digits": "00442079460958"},
+            {"_id": 3, "name": "Zoé", "email": "z@x.fr", "phone": "06 12 34 56 78"},
+        ])
+        updated = await guest_lookup.backfill(collection)
+        again = await guest_lookup.backfill(collection)
+        return updated, again, {doc["_id"]: doc["phone_digits"] async for doc in collection.find()}
+
+    updated, again, digits = asyncio.run(scenario())
+    assert (updated, again) == (2, 0)
+    assert digits == {1: "0765872934", 2: "00442079460958", 3: "0612345678"}
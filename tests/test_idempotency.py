@@ -0,0 +1,199 @@
+import asyncio
+import hashlib
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from fastapi import HTTPException
+from pydantic import BaseModel
+from pymongo.errors import AutoReconnect
+
+mongomock_motor = pytest.importorskip("mongomock_motor")
+
+from idempotency import IdempotencyStore  # noqa: E402
+
+
+class Booking(BaseModel):
+    guests: int
+
+
+class Handler:
+    def __init__(self, fail: bool = False):
+        self.calls = 0
+        self.fail = fail
+
+    async def __call__(self):
+        self.calls += 1
+        if self.fail:
+            raise RuntimeError("booking failed")
+        return Booking(guests=self.calls)
+
+
+def make_store(cache_size: int = 10):
+    collection = mongomock_motor.AsyncMongoMockClient()["idempotency_tests"]["idempotency_keys"]
+    return IdempotencyStore(collection, cache_size=cache_size)
+
+
+def run(coroutine):
+    return asyncio.run(coroutine)
+
+
+def test_retry_replays_the_stored_response():
+    async def scenario():
+        store, handler = make_store(), Handler()
+        first = await store.run("reservations", "key-1", Booking(guests=2), handler)
+        again = await store.run("reservations", "key-1", Booking(guests=2), handler)
+        return handler, first, again
+
+    handler, first, again = run(scenario())
+    assert handler.calls == 1
+    assert first == Booking(guests=1)
+    assert again == {"guests": 1}
+
+
+def test_replay_from_the_database_on_another_worker():
+    async def scenario():
+        store, handler = make_store(), Handler()
+        await store.run("reservations", "key-1", Booking(guests=2), handler)
+        other = IdempotencyStore(store.collection)
+        return handler, await other.run("reservations", "key-1", Booking(guests=2), handler)
+
+    handler, replayed = run(scenario())
+    assert handler.calls == 1
+    assert replayed == {"guests": 1}
+
+
+def test_key_reused_with_another_body_is_rejected():
+    async def scenario():
+        store = make_store()
+        await store.run("reservations", "key-1", Booking(guests=2), Handler())
+        await store.run("reservations", "key-1", Booking(guests=4), Handler())
+
+    with pytest.raises(HTTPException) as error:
+        run(scenario())
+    assert error.value.status_code == 422
+
+
+def test_key_in_progress_conflicts():
+    async def scenario():
+        store = make_store()
+        started, release = asyncio.Event(), asyncio.Event()
+
+        async def slow():
+            started.set()
+            await release.wait()
+            return Booking(guests=2)
+
+        first = asyncio.create_task(store.run("reservations", "key-1", Booking(guests=2), slow))
+        await started.wait()
+        try:
+            await store.run("reservations", "key-1", Booking(guests=2), Handler())
+        finally:
+            release.set()
+            await first
+
+    with pytest.raises(HTTPException) as error:
+        run(scenario())
+    assert error.value.status_code == 409
+
+
+def stale_claim(store, fingerprint_of=Booking(guests=2), **fields):
+    return store.collection.insert_one({
+        "_id": "reservations:key-1",
+        "fingerprint": hashlib.sha256(fingerprint_of.model_dump_json().encode()).hexdigest(),
+        "status": "pending",
+        "claim": "dead-worker",
+        "created_at": datetime.now(timezone.utc),
+        **fields
+    })
+
+
+def test_expired_claim_is_taken_over():
+    async def scenario():
+        store, handler = make_store(), Handler()
+        await stale_claim(store, pending_until=datetime.now(timezone.utc) - timedelta(seconds=1))
+        result = await store.run("reservations", "key-1", Booking(guests=2), handler)
+        return handler, result, await store.collection.find_one({})
+
+    handler, result, record = run(scenario())
+    assert handler.calls == 1
+    assert result == Booking(guests=1)
+    assert record["status"] == "completed"
+    assert record["claim"] != "dead-worker"
+
+
+def test_claim_without_lease_is_taken_over():
+    async def scenario():
+        store = make_store()
+        await stale_claim(store)
+        return await store.run("reservations", "key-1", Booking(guests=2), Handler())
+
+    assert run(scenario()) == Booking(guests=1)
+
+
+def test_live_claim_is_not_taken_over():
+    async def scenario():
+        store = make_store()
+        await stale_claim(store, pending_until=datetime.now(timezone.utc) + timedelta(seconds=60))
+        await store.run("reservations", "key-1", Booking(guests=2), Handler())
+
+    with pytest.raises(HTTPException) as error:
+        run(scenario())
+    assert error.value.status_code == 409
+
+
+def test_expired_claim_with_another_body_is_rejected():
+    async def scenario():
+        store = make_store()
+        await stale_claim(store, Booking(guests=6), pending_until=datetime.now(timezone.utc) - timedelta(seconds=1))
+        await store.run("reservations", "key-1", Booking(guests=2), Handler())
+
+    with pytest.raises(HTTPException) as error:
+        run(scenario())
+    assert error.value.status_code == 422
+
+
+def test_response_served_when_it_cannot_be_stored():
+    async def scenario():
+        store, handler = make_store(), Handler()
+
+        async def unreachable(*args, **kwargs):
+            raise AutoReconnect("connection lost")
+
+        store.collection.update_one = unreachable
+        first = await store.run("reservations", "key-1", Booking(guests=2), handler)
+        again = await store.run("reservations", "key-1", Booking(guests=2), handler)
+        return handler, first, again
+
+    handler, first, again = run(scenario())
+    assert handler.calls == 1
+    assert first == Booking(guests=1)
+    assert again == {"guests": 1}
+
+
+def test_failed_request_releases_the_key():
+    async def scenario():
+        store = make_store()
+        with pytest.raises(RuntimeError):
+            await store.run("reservations", "key-1", Booking(guests=2), Handler(fail=True))
+        return await store.run("reservations", "key-1", Booking(guests=2), Handler())
+
+    assert run(scenario()) == Booking(guests=1)
+
+
+def test_scopes_and_missing_key_are_independent():
+    async def scenario():
+        store, handler = make_store(), Handler()
+        await store.run("reservations", "key-1", Booking(guests=2), handler)
+        await store.run("contact", "key-1", Booking(guests=2), handler)
+        await store.run("reservations", None, Booking(guests=2), handler)
+        await store.run("reservations", None, Booking(guests=2), handler)
+        return handler.calls
+
+    assert run(scenario()) == 4
+
+
+@pytest.mark.parametrize("key", ["", "k" * 256])
+def test_invalid_key(key):
+    with pytest.raises(HTTPException) as error:
+        run(make_store().run("reservations", key, Booking(guests=2), Handler()))
+    assert error.value.status_code == 422
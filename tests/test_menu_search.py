@@ -0,0 +1,65 @@
+from menu_search import MenuIndex, fold, tokens
+
+MENU = {
+    "entrees": [
+        {"name": "Velouté de butternut", "description": "Crème fraîche", "price": 12},
+        {"name": "Œuf parfait 63°", "description": "Crème de champignons", "price": 13},
+    ],
+    "plats": [
+        {"name": "Filet de bœuf Rossini", "description": "Foie gras poêlé", "price": 38},
+        {"name": "Burrata crémeuse", "description": "Tomates anciennes", "price": 14},
+    ],
+}
+
+
+def names(results):
+    return [item["name"] for item in results]
+
+
+def test_fold_strips_accents_and_ligatures():
+    assert fold("Crème Brûlée") == "creme brulee"
+    assert fold("Œuf et bœuf") == "oeuf et boeuf"
+    assert fold("ÆSIR") == "aesir"
+
+
+def test_tokens():
+    assert tokens("Œuf parfait 63°, crème!") == ["oeuf", "parfait", "63", "creme"]
+    assert tokens("  ") == []
+
+
+def test_search_is_accent_insensitive_prefix():
+    index = MenuIndex(MENU)
+    assert names(index.search("veloute")) == ["Velouté de butternut"]
+    assert names(index.search("boeuf")) == ["Filet de bœuf Rossini"]
+    assert names(index.search("OEUF")) == ["Œuf parfait 63°"]
+    # "crem" starts "Crème" and "crémeuse", in menu order
+    assert names(index.search("crem")) == ["Velouté de butternut", "Œuf parfait 63°", "Burrata crémeuse"]
+    assert names(index.search("crem champ")) == ["Œuf parfait 63°"]
+    assert index.search("homard") == []
+
+
+def test_search_filters():
+    index = MenuIndex(MENU)
+    assert names(index.search("crem", category="plats")) == ["Burrata crémeuse"]
+    assert names(index.search(min_price=13, max_price=14)) == ["Œuf parfait 63°", "Burrata crémeuse"]
+
+
+def test_update_reindexes_changed_items():
+    index = MenuIndex(MENU)
+    menu = {
+        "entrees": [{"name": "Velouté de potimarron", "description": "Noisettes", "price": 12}],
+        "plats": MENU["plats"],
+    }
+    index.update(menu)
+    assert index.search("butternut") == []
+    assert names(index.search("potimarron")) == ["Velouté de potimarron"]
+    assert index.search("oeuf") == []
+    assert "butternut" not in index.vocabulary
+
+
+def test_copy_is_independent():
+    index = MenuIndex(MENU)
+    copy = index.copy()
+    copy.update({"plats": MENU["plats"]})
+    assert names(index.search("veloute")) == ["Velouté de butternut"]
+    assert copy.search("veloute") == []
@@ -0,0 +1,158 @@
+import asyncio
+from datetime import timedelta
+
+import pytest
+
+mongomock_motor = pytest.importorskip("mongomock_motor")
+
+from outbox import (  # noqa: E402
+    DONE, FAILED, PENDING, PENDING_FIELD, RESERVATION_CANCELLED, RESERVATION_CREATED, RUNNING,
+    FakeNotifier, Outbox, pending
+)
+
+
+def make_outbox(notifier=None, **options):
+    db = mongomock_motor.AsyncMongoMockClient()["outbox_tests"]
+    outbox = Outbox(db.outbox, {"email": notifier or FakeNotifier()}, **options)
+    outbox.relay_from(db.reservations, {"_id": 0, "id": 1, "status": 1})
+    return outbox
+
+
+def run(coroutine):
+    return asyncio.run(coroutine)
+
+
+def test_claim_leases_due_jobs_once():
+    async def scenario():
+        outbox = make_outbox()
+        await outbox.enqueue(RESERVATION_CREATED, [{"id": "a"}, {"id": "b"}])
+        first = await outbox.claim("w1")
+        second = await outbox.claim("w2")
+        return first, second
+
+    first, second = run(scenario())
+    assert sorted(job["_id"] for job in first) == ["email:reservation.created:a", "email:reservation.created:b"]
+    assert all(job["status"] == RUNNING and job["attempts"] == 1 for job in first)
+    assert second == []
+
+
+def test_enqueue_is_idempotent():
+    async def scenario():
+        outbox = make_outbox()
+        await outbox.enqueue(RESERVATION_CREATED, [{"id": "a"}])
+        await outbox.enqueue(RESERVATION_CREATED, [{"id": "a"}])
+        return await outbox.collection.count_documents({})
+
+    assert run(scenario()) == 1
+
+
+def test_expired_lease_is_claimed_again():
+    async def scenario():
+        outbox = make_outbox(lease_seconds=0)
+        await outbox.enqueue(RESERVATION_CREATED, [{"id": "a"}])
+        first = await outbox.claim("w1")
+        second = await outbox.claim("w2")
+        return first, second
+
+    first, second = run(scenario())
+    assert [job["_id"] for job in second] == [job["_id"] for job in first]
+    assert second[0]["attempts"] == 2
+    assert second[0]["claim"] != first[0]["claim"]
+
+
+def test_backoff_grows_and_is_capped():
+    outbox = make_outbox(base_delay=2.0, max_delay=60.0)
+    for attempts, ceiling in [(1, 2.0), (2, 4.0), (3, 8.0), (10, 60.0)]:
+        delay = outbox.backoff(attempts)
+        assert ceiling / 2 <= delay <= ceiling
+
+
+def test_failed_delivery_is_retried_later():
+    async def scenario():
+        notifier = FakeNotifier(failures=1)
+        outbox = make_outbox(notifier)
+        await outbox.enqueue(RESERVATION_CREATED, [{"id": "a"}])
+        [job] = await outbox.claim("w1")
+        await outbox.deliver(job)
+        stored = await outbox.collection.find_one({"_id": job["_id"]})
+        return notifier, job, stored, await outbox.claim("w1")
+
+    notifier, job, stored, claimed = run(scenario())
+    assert stored["status"] == PENDING
+    assert "RuntimeError" in stored["error"]
+    assert stored["available_at"] >= job["available_at"] + timedelta(seconds=0.5)
+    assert "claim" not in stored
+    assert notifier.sent == []
+    # Not due until its backoff has passed
+    assert claimed == []
+
+
+def test_job_fails_after_max_attempts():
+    async def scenario():
+        notifier = FakeNotifier(failures=10)
+        outbox = make_outbox(notifier, max_attempts=2, base_delay=0, lease_seconds=60)
+        await outbox.enqueue(RESERVATION_CREATED, [{"id": "a"}])
+        for _ in range(3):
+            for job in await outbox.claim("w1"):
+                await outbox.deliver(job)
+        return notifier, await outbox.collection.find_one({})
+
+    notifier, stored = run(scenario())
+    assert notifier.attempts == 2
+    assert stored["status"] == FAILED
+    assert stored["attempts"] == 2
+    assert stored["error"] == "RuntimeError: Simulated failure 2"
+
+
+def test_delivered_job_is_done():
+    async def scenario():
+        notifier = FakeNotifier()
+        outbox = make_outbox(notifier)
+        await outbox.enqueue(RESERVATION_CREATED, [{"id": "a", "guests": 2}])
+        [job] = await outbox.claim("w1")
+        await outbox.deliver(job)
+        return notifier, await outbox.collection.find_one({})
+
+    notifier, stored = run(scenario())
+    assert notifier.sent == [(RESERVATION_CREATED, {"id": "a", "guests": 2})]
+    assert stored["status"] == DONE
+    assert "lease_until" not in stored
+
+
+def test_relay_moves_pending_entries_to_jobs():
+    async def scenario():
+        outbox = make_outbox()
+        await outbox.source.insert_many([
+            {"id": "a", "status": "cancelled",
+             PENDING_FIELD: [pending(RESERVATION_CREATED), pending(RESERVATION_CANCELLED)]},
+            {"id": "b", "status": "confirmed"},
+        ])
+        relayed = await outbox.relay()
+        again = await outbox.relay()
+        jobs = await outbox.collection.find({}, {"_id": 1, "payload": 1}).to_list(None)
+        return relayed, again, jobs, await outbox.source.find_one({"id": "a"})
+
+    relayed, again, jobs, reservation = run(scenario())
+    assert (relayed, again) == (1, 0)
+    assert sorted(job["_id"] for job in jobs) == [
+        "email:reservation.cancelled:a", "email:reservation.created:a"
+    ]
+    assert all(job["payload"] == {"id": "a", "status": "cancelled"} for job in jobs)
+    assert PENDING_FIELD not in reservation
+
+
+def test_workers_deliver_relayed_entries():
+    async def scenario():
+        notifier = FakeNotifier()
+        outbox = make_outbox(notifier, workers=2, poll_interval=0.01)
+        outbox.start()
+        await outbox.source.insert_one({"id": "a", "status": "confirmed", PENDING_FIELD: [pending(RESERVATION_CREATED)]})
+        outbox.notify()
+        for _ in range(100):
+            if notifier.sent:
+                break
+            await asyncio.sleep(0.01)
+        await outbox.stop()
+        return notifier
+
+    assert run(scenario()).sent == [(RESERVATION_CREATED, {"id": "a", "status": "confirmed"})]
@@ -0,0 +1,40 @@
+import base64
+import json
+import os
+
+import pytest
+from fastapi import HTTPException
+
+os.environ.setdefault("MONGO_URL", "mongodb://localhost:27017")
+os.environ.setdefault("DB_NAME", "pagination_tests")
+
+from server import decode_cursor, encode_cursor
+
+
+def raw_cursor(value) -> str:
+    return base64.urlsafe_b64encode(json.dumps(value).encode()).decode()
+
+
+def test_cursor_round_trip():
+    cursor = encode_cursor({"created_at": "2026-11-02T10:00:00+00:00", "id": "abc"})
+
+    assert decode_cursor(cursor) == {"$or": [
+        {"created_at": {"$gt": "2026-11-02T10:00:00+00:00"}},
+        {"created_at": "2026-11-02T10:00:00+00:00", "id": {"$gt": "abc"}}
+    ]}
+
+
+@pytest.mark.parametrize("cursor", [
+    "not base64!",
+    raw_cursor([{"$exists": True}, "x"]),
+    raw_cursor(["2026-11-02", {"$ne": None}]),
+    raw_cursor("ab"),
+    raw_cursor(["a", "b", "c"]),
+    raw_cursor([1, 2]),
+    raw_cursor(None),
+])
+def test_malformed_cursor_is_rejected(cursor):
+    with pytest.raises(HTTPException) as error:
+        decode_cursor(cursor)
+
+    assert error.value.status_code == 422
@@ -0,0 +1,50 @@
+import asyncio
+import os
+
+import pytest
+from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo.errors import PyMongoError
+
+from indexes import INDEXES, ROUTE_QUERIES, ensure_indexes, find_collscans
+
+# Explain plans need a real mongod; the test is skipped when none answers
+MONGO_URL = os.environ.get("MONGO_URL", "mongodb://localhost:27017")
+
+
+def test_route_queries_use_an_index():
+    async def scenario():
+        client = AsyncIOMotorClient(MONGO_URL, serverSelectionTimeoutMS=1000)
+        try:
+            await client.admin.command("ping")
+        except PyMongoError:
+            pytest.skip(f"No MongoDB server at {MONGO_URL}")
+        db = client["query_plan_tests"]
+        try:
+            await ensure_indexes(db)
+            return await find_collscans(db)
+        finally:
+            await client.drop_database(db)
+            client.close()
+
+    assert asyncio.run(scenario()) == []
+
+
+def _filtered_fields(query: dict) -> set:
+    # Fields every document of the result is filtered on, through $and/$or
+    fields = set()
+    for field, value in query.items():
+        if field == "$and":
+            fields.update(*(_filtered_fields(branch) for branch in value))
+        elif field == "$or":
+            fields.update(set.intersection(*(_filtered_fields(branch) for branch in value)))
+        else:
+            fields.add(field)
+    return fields
+
+
+@pytest.mark.parametrize("name, collection, query, sort", ROUTE_QUERIES, ids=[query[0] for query in ROUTE_QUERIES])
+def test_route_query_matches_an_index_prefix(name, collection, query, sort):
+    """Without a server: the query filters on, or sorts by, the leading key of an index."""
+    leading = {"_id"} | {next(iter(index.document["key"])) for index in INDEXES.get(collection, [])}
+    usable = _filtered_fields(query) | ({sort[0][0]} if sort else set())
+    assert leading & usable, f"{name} filters on {sorted(usable)}, indexes on {collection} start with {sorted(leading)}"
@@ -0,0 +1,151 @@
+import asyncio
+import os
+
+import pytest
+from fastapi import HTTPException
+from starlette.requests import Request
+
+import ratelimit
+from ratelimit import AdmissionControl, Slot, TokenBucketLimiter
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(ratelimit.time, "monotonic", clock)
+    return clock
+
+
+def test_token_bucket_allows_a_burst_then_refills(clock):
+    limiter = TokenBucketLimiter(rate=2, burst=3)
+    assert [limiter.acquire("a") for _ in range(3)] == [0, 0, 0]
+    assert limiter.acquire("a") == pytest.approx(0.5)
+    # Other clients have their own bucket
+    assert limiter.acquire("b") == 0
+    clock.now += 0.5
+    assert limiter.acquire("a") == 0
+    clock.now += 60
+    assert [limiter.acquire("a") for _ in range(4)][-1] > 0
+
+
+def test_token_bucket_evicts_least_recently_used(clock):
+    limiter = TokenBucketLimiter(rate=1, burst=1, max_keys=2)
+    limiter.acquire("a")
+    limiter.acquire("b")
+    limiter.acquire("a")
+    limiter.acquire("c")
+    assert set(limiter._buckets) == {"a", "c"}
+
+
+def request(forwarded=None, host="10.0.0.1"):
+    headers = [(b"x-forwarded-for", forwarded.encode())] if forwarded is not None else []
+    return Request({"type": "http", "headers": headers, "client": (host, 1234)})
+
+
+def test_client_ip_defaults_to_the_connection():
+    admission = AdmissionControl()
+    assert admission.client_ip(request("1.1.1.1")) == "10.0.0.1"
+
+
+@pytest.mark.parametrize("trusted_proxies, forwarded, client", [
+    # The proxy appends the address it saw; anything left of it is the client's say
+    (1, "6.6.6.6, 1.1.1.1", "1.1.1.1"),
+    (1, "1.1.1.1", "1.1.1.1"),
+    # CDN then ingress: the CDN appended the client, the ingress appended the CDN
+    (2, "6.6.6.6, 1.1.1.1, 172.16.0.5", "1.1.1.1"),
+    # Fewer hops than proxies: the outermost proxy's entry is the leftmost
+    (2, "1.1.1.1", "1.1.1.1"),
+    (1, " 6.6.6.6 ,1.1.1.1 , ", "1.1.1.1"),
+    (1, "", "10.0.0.1"),
+    (1, None, "10.0.0.1"),
+])
+def test_client_ip_takes_the_hop_of_the_outermost_trusted_proxy(trusted_proxies, forwarded, client):
+    admission = AdmissionControl(trusted_proxies=trusted_proxies)
+    assert admission.client_ip(request(forwarded)) == client
+
+
+def test_limit_answers_429_with_retry_after(clock):
+    admission = AdmissionControl()
+    dependency = admission.limit("test", rate=0.5, burst=1)
+    asyncio.run(dependency(request()))
+    with pytest.raises(HTTPException) as error:
+        asyncio.run(dependency(request()))
+    assert error.value.status_code == 429
+    assert error.value.headers == {"Retry-After": "2"}
+
+
+def test_concurrency_slot_released_once():
+    in_flight = {"reads": 0}
+    slot = Slot(in_flight, "reads")
+    assert in_flight["reads"] == 1
+    slot.release()
+    slot.release()
+    assert in_flight["reads"] == 0
+
+
+def test_concurrency_sheds_over_the_limit():
+    async def scenario():
+        admission = AdmissionControl()
+        dependency = admission.concurrency("reads", 1)
+        held = dependency()
+        await held.__anext__()
+        with pytest.raises(HTTPException) as error:
+            await dependency().__anext__()
+        await held.aclose()
+        return error.value.status_code, admission.in_flight["reads"]
+
+    assert asyncio.run(scenario()) == (503, 0)
+
+
+@pytest.fixture
+def server(monkeypatch):
+    mongomock_motor = pytest.importorskip("mongomock_motor")
+    os.environ.setdefault("MONGO_URL", "mongodb://localhost:27017")
+    os.environ.setdefault("DB_NAME", "ratelimit_tests")
+    import server
+
+    monkeypatch.setattr(server, "db", mongomock_motor.AsyncMongoMockClient()["ratelimit_tests"])
+    return server
+
+
+def test_ndjson_export_holds_its_read_slot_until_streamed(server):
+    async def scenario():
+        await server.db.reservations.insert_many([
+            {"id": str(i), "created_at": f"2026-01-01T00:00:0{i}", "date": "2026-11-02"} for i in range(3)
+        ])
+        admission = AdmissionControl()
+        dependency = admission.concurrency("reads", 1)()
+        slot = await dependency.__anext__()
+        response = await server.get_reservations(
+            slot=slot, date=None, status=None, cursor=None, limit=10, format="ndjson"
+        )
+        # FastAPI runs the dependency's exit before sending a streamed body
+        await dependency.aclose()
+        held = admission.in_flight["reads"]
+        lines = [line async for line in response.body_iterator]
+        return held, len(lines), admission.in_flight["reads"]
+
+    assert asyncio.run(scenario()) == (1, 3, 0)
+
+
+def test_ndjson_slot_released_when_the_body_is_never_sent(server):
+    async def scenario():
+        admission = AdmissionControl()
+        dependency = admission.concurrency("reads", 1)()
+        slot = await dependency.__anext__()
+        response = await server.get_reservations(
+            slot=slot, date=None, status=None, cursor=None, limit=10, format="ndjson"
+        )
+        await dependency.aclose()
+        await response.background()
+        return admission.in_flight["reads"]
+
+    assert asyncio.run(scenario()) == 0
@@ -0,0 +1,76 @@
+from datetime import date
+
+import pytest
+
+from schedule import CLOSED, DaySlots, Schedule, parse_hours
+
+HOURS = {
+    "monday": "12:00 - 23:30",
+    "tuesday": CLOSED,
+    "wednesday": "19:00 - 02:00",
+    "thursday": "12:00 - 14:30, 19:00 - 22:00",
+}
+
+
+def test_parse_hours():
+    assert parse_hours("12:00 - 23:45") == [(720, 1425)]
+    assert parse_hours("12:00-14:00, 19:00 - 22:30") == [(720, 840), (1140, 1350)]
+    # Closing after midnight ends after 24:00
+    assert parse_hours("19:00 - 02:00") == [(1140, 1560)]
+    assert parse_hours(CLOSED) == []
+    assert parse_hours("") == []
+
+
+@pytest.mark.parametrize("hours", ["12h - 23h", "12:00", "midi - minuit"])
+def test_parse_hours_rejects_malformed(hours):
+    with pytest.raises(ValueError):
+        parse_hours(hours)
+
+
+def test_day_slots_leave_time_before_closing():
+    slots = DaySlots("12:00 - 14:30, 19:00 - 22:00")
+    assert slots.lunch == ("12:00", "12:30", "13:00", "13:30")
+    assert slots.dinner == ("19:00", "19:30", "20:00", "20:30", "21:00")
+    assert DaySlots(CLOSED).closed
+
+
+def test_weekdays():
+    schedule = Schedule(HOURS)
+    # 2026-11-02 is a Monday
+    assert "12:00" in schedule.day("2026-11-02").lunch
+    assert schedule.day("2026-11-03").closed
+    assert schedule.day("2026-11-04").lunch == ()
+    assert schedule.day("2026-11-04").dinner[-1] == "21:30"
+    # No hours given for Friday
+    assert schedule.day("2026-11-06").closed
+
+
+def test_exceptions_override_the_weekday():
+    schedule = Schedule(HOURS, {"2026-11-02": CLOSED, "2026-11-03": "19:00 - 23:00"})
+    assert schedule.day("2026-11-02").closed
+    assert schedule.day("2026-11-03").lunch == ()
+    assert schedule.day("2026-11-03").dinner == ("19:00", "19:30", "20:00", "20:30", "21:00", "21:30")
+    # The following Monday keeps its hours
+    assert not schedule.day("2026-11-09").closed
+
+
+def test_check():
+    schedule = Schedule(HOURS, {"2026-12-25": CLOSED})
+    today = date(2026, 11, 2)
+    assert schedule.check("2026-11-02", "19:30", today) is None
+    assert schedule.check("2026-11-02", "17:00", today) == "This time is not a bookable slot"
+    assert schedule.check("2026-12-25", "19:30", today) == "The restaurant is closed on this date"
+    assert schedule.check("2026-02-30", "19:30", today) == "Invalid date"
+
+
+def test_check_rejects_past_dates():
+    schedule = Schedule(HOURS, {"2026-10-26": "12:00 - 23:00"})
+    today = date(2026, 11, 2)
+    assert schedule.check("2026-10-26", "19:30", today) == "This date is in the past"
+    assert schedule.check("2020-01-06", "19:30", today) == "This date is in the past"
+    assert schedule.check("2099-01-05", "19:30") is None
+
+
+def test_invalid_date():
+    with pytest.raises(ValueError):
+        Schedule(HOURS).day("not-a-date")
@@ -0,0 +1,81 @@
+import seating
+from seating import COVERS_CAPACITY, TABLES, DayLedger, DayPlan, admission, release, table_options
+
+
+def test_sitting_covers_four_marks():
+    assert seating.sitting_marks("19:00") == ["19:00", "19:30", "20:00", "20:30"]
+    # Clamped at the end of the day
+    assert seating.sitting_marks("23:00") == ["23:00", "23:30"]
+
+
+def test_table_options_best_fit_first():
+    assert table_options(2)[0] == {2: 1}
+    assert table_options(5)[0] == {6: 1}
+    assert table_options(7)[0] == {8: 1}
+    # Larger than any table: pushed together
+    assert table_options(16)[0] == {8: 2}
+    assert all(sum(size * count for size, count in tables.items()) >= 12 for tables in table_options(12))
+
+
+def test_admission_conditions_and_increments():
+    conditions, increments = admission("19:00", 4, {4: 1})
+    assert increments == {
+        f"slots.{mark}.{field}": value
+        for mark in ["19:00", "19:30", "20:00", "20:30"]
+        for field, value in (("covers", 4), ("t4", 1))
+    }
+    assert conditions["slots.19:30.covers"] == {"$not": {"$gt": COVERS_CAPACITY - 4}}
+    assert conditions["slots.20:30.t4"] == {"$not": {"$gt": TABLES[4] - 1}}
+
+
+def test_release_undoes_admission():
+    _, increments = admission("12:30", 6, {6: 1})
+    assert release("12:30", 6, {6: 1}) == {path: -value for path, value in increments.items()}
+
+
+def occupancy(mark_usage):
+    return {"_id": "2026-11-02", "slots": mark_usage}
+
+
+def test_day_plan_sees_whole_sitting():
+    # Every 8-top taken at 20:30 only
+    plan = DayPlan(occupancy({"20:30": {"covers": 16, "t8": 2}}))
+    assert plan.options(8, "21:00")[0] == {8: 1}
+    # A 19:00 sitting still holds its tables at 20:30
+    assert {8: 1} not in plan.options(8, "19:00")
+    assert plan.can_seat(8, "19:00")
+
+
+def test_day_plan_full_covers():
+    plan = DayPlan(occupancy({"19:30": {"covers": COVERS_CAPACITY - 1}}))
+    assert plan.available(2, ["18:00", "19:00", "21:30"]) == ["21:30"]
+    assert plan.can_seat(1, "19:00")
+
+
+def test_ledger_seats_parties_until_tables_run_out():
+    ledger = DayLedger()
+    seated = [ledger.seat(8, "19:00") for _ in range(3)]
+    assert seated[:2] == [{8: 1}, {8: 1}]
+    # The 8-tops are gone, so the third party gets another combination
+    assert seated[2] is not None and 8 not in seated[2]
+    assert ledger.covers[seating.mark_index("20:30")] == 24
+
+
+def test_ledger_refuses_over_capacity():
+    ledger = DayLedger(occupancy({"20:00": {"covers": COVERS_CAPACITY - 3}}))
+    assert ledger.seat(4, "19:00") is None
+    assert ledger.increments == {}
+    assert ledger.seat(2, "19:00") == {2: 1}
+
+
+def test_ledger_admission_accumulates_the_batch():
+    ledger = DayLedger(occupancy({"19:00": {"covers": 10, "t2": 5}}))
+    ledger.seat(2, "19:00")
+    ledger.seat(3, "19:00")
+    conditions, increments = ledger.admission()
+    assert increments["slots.19:00.covers"] == 5
+    assert increments["slots.19:00.t2"] == 1
+    assert increments["slots.19:00.t4"] == 1
+    # Room for the batch on top of whatever is stored when it is written
+    assert conditions["slots.19:00.covers"] == {"$not": {"$gt": COVERS_CAPACITY - 5}}
+    assert conditions["slots.19:00.t2"] == {"$not": {"$gt": TABLES[2] - 1}}
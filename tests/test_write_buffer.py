@@ -0,0 +1,148 @@
+import asyncio
+
+import pytest
+from pymongo.errors import AutoReconnect, BulkWriteError
+
+from write_buffer import BufferFull, WriteBuffer
+
+
+class Collection:
+    """Records insert_many batches; the first `failures` calls raise `error`."""
+
+    name = "messages"
+
+    def __init__(self, failures: int = 0, error: Exception = AutoReconnect("connection lost")):
+        self.failures = failures
+        self.error = error
+        self.batches = []
+        self.calls = 0
+        self.blocked = None
+
+    async def insert_many(self, docs, ordered=True):
+        self.calls += 1
+        if self.blocked is not None:
+            await self.blocked.wait()
+        if self.calls <= self.failures:
+            raise self.error
+        self.batches.append([doc["n"] for doc in docs])
+
+
+def run(coroutine):
+    return asyncio.run(coroutine)
+
+
+def test_flushes_when_the_batch_is_full():
+    async def scenario():
+        collection = Collection()
+        buffer = WriteBuffer(collection, max_batch=3, flush_interval=60)
+        buffer.start()
+        for n in range(7):
+            await buffer.put({"n": n})
+        await asyncio.sleep(0.01)
+        written = list(collection.batches)
+        await buffer.close()
+        return written, collection.batches
+
+    written, batches = run(scenario())
+    assert written == [[0, 1, 2], [3, 4, 5]]
+    assert batches == [[0, 1, 2], [3, 4, 5], [6]]
+
+
+def test_flushes_after_the_interval():
+    async def scenario():
+        collection = Collection()
+        buffer = WriteBuffer(collection, max_batch=100, flush_interval=0.05)
+        buffer.start()
+        await buffer.put({"n": 1})
+        await buffer.put({"n": 2})
+        before = list(collection.batches)
+        await asyncio.sleep(0.1)
+        after = list(collection.batches)
+        await buffer.close()
+        return before, after
+
+    assert run(scenario()) == ([], [[1, 2]])
+
+
+def test_put_raises_when_full():
+    async def scenario():
+        collection = Collection()
+        collection.blocked = asyncio.Event()
+        buffer = WriteBuffer(collection, max_batch=1, flush_interval=0, max_pending=2, put_timeout=0.02)
+        buffer.start()
+        await buffer.put({"n": 0})
+        await asyncio.sleep(0.01)
+        # The flusher is stuck on n=0: two more fit in the queue, the next is shed
+        await buffer.put({"n": 1})
+        await buffer.put({"n": 2})
+        with pytest.raises(BufferFull):
+            await buffer.put({"n": 3})
+        collection.blocked.set()
+        await buffer.close()
+        return collection.batches
+
+    assert run(scenario()) == [[0], [1], [2]]
+
+
+def test_put_raises_once_closing():
+    async def scenario():
+        buffer = WriteBuffer(Collection())
+        buffer.start()
+        await buffer.close()
+        with pytest.raises(BufferFull):
+            await buffer.put({"n": 0})
+
+    run(scenario())
+
+
+def test_failed_batch_is_retried_until_written():
+    async def scenario():
+        collection = Collection(failures=5)
+        buffer = WriteBuffer(collection, flush_interval=0, max_delay=0.01)
+        buffer.start()
+        await buffer.put({"n": 1})
+        await asyncio.sleep(0.3)
+        written = list(collection.batches)
+        await buffer.close()
+        return collection.calls, written
+
+    # More failures than `retries`: still written while the buffer is open
+    assert run(scenario()) == (6, [[1]])
+
+
+def test_close_drains_the_queue():
+    async def scenario():
+        collection = Collection()
+        buffer = WriteBuffer(collection, max_batch=2, flush_interval=60)
+        buffer.start()
+        for n in range(5):
+            await buffer.put({"n": n})
+        await buffer.close()
+        return collection.batches
+
+    assert [n for batch in run(scenario()) for n in batch] == [0, 1, 2, 3, 4]
+
+
+def test_close_gives_up_after_retries():
+    async def scenario():
+        collection = Collection(failures=100)
+        buffer = WriteBuffer(collection, flush_interval=60, retries=3, max_delay=0.01)
+        buffer.start()
+        await buffer.put({"n": 1})
+        await asyncio.wait_for(buffer.close(), 5)
+        return collection.calls, collection.batches
+
+    assert run(scenario()) == (3, [])
+
+
+def test_duplicates_are_not_retried():
+    async def scenario():
+        error = BulkWriteError({"writeErrors": [{"code": 11000, "errmsg": "duplicate key", "index": 0}]})
+        collection = Collection(failures=1, error=error)
+        buffer = WriteBuffer(collection, flush_interval=0)
+        buffer.start()
+        await buffer.put({"n": 1})
+        await buffer.close()
+        return collection.calls
+
+    assert run(scenario()) == 1